@@ -0,0 +1,68 @@
+"""勝敗判定と生存者リストの作成を、全走査とビットマスクで比べる
+
+python -m bench.alive [人数]
+"""
+
+import random
+import sys
+import timeit
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from services.engine import Engine, Role, RoleType, getRoleType
+
+
+@dataclass(slots=True)
+class Player:
+    id: int
+    role: Role
+    roleType: RoleType
+    dead: bool = False
+
+
+def build(players: int) -> Tuple[List[Player], Engine]:
+    roles = [Role.WEREWOLF] * (players // 5) + [Role.FOX, Role.TELLER, Role.KNIGHT]
+    roles += [Role.VILLAGER] * (players - len(roles))
+    members = [
+        Player(id=i, role=role, roleType=getRoleType(role))
+        for i, role in enumerate(random.sample(roles, players))
+    ]
+    members.sort(key=lambda m: m.roleType)
+    engine = Engine([(member.id, member.role) for member in members])
+    for member in random.sample(members, players // 3):
+        member.dead = True
+        engine.kill(member.id)
+    return members, engine
+
+
+def scan(members: List[Player]):
+    werewolf = len([m for m in members if m.role == Role.WEREWOLF and not m.dead])
+    villagers = len(
+        [m for m in members if m.roleType == RoleType.VILLAGER and not m.dead]
+    )
+    foxies = len([m for m in members if m.role == Role.FOX and not m.dead])
+    targets = [m.id for m in members if not m.dead and m.role != Role.WEREWOLF]
+    return werewolf, villagers, foxies, targets
+
+
+def masked(engine: Engine):
+    werewolf = engine.countAlive(role=Role.WEREWOLF)
+    villagers = engine.countAlive(roleType=RoleType.VILLAGER)
+    foxies = engine.countAlive(role=Role.FOX)
+    targets = engine.alive(exclude=Role.WEREWOLF)
+    return werewolf, villagers, foxies, targets
+
+
+def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    members, engine = build(players)
+    assert scan(members) == masked(engine)
+
+    number = 20000
+    for name, func, arg in (("scan", scan, members), ("masked", masked, engine)):
+        seconds = min(timeit.repeat(lambda: func(arg), number=number, repeat=5))
+        print(f"{name:>6}: {seconds / number * 1e6:.2f} us/check ({players} players)")
+
+
+if __name__ == "__main__":
+    main()
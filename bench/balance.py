@@ -0,0 +1,63 @@
+"""配役の勝率の見積もりと提案にかかる時間を測る
+
+python -m bench.balance --players 5 9 15 30 60
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from bench.game import castFor
+from services.balance import estimate, suggest
+from services.engine import EndType, Role
+
+ROLES = {
+    "werewolf": Role.WEREWOLF,
+    "teller": Role.TELLER,
+    "knight": Role.KNIGHT,
+    "psychic": Role.PSYCHIC,
+    "fox": Role.FOX,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[5, 9, 15, 30, 60])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for players in args.players:
+        cast = {ROLES[name]: count for name, count in castFor(players).items()}
+        rng = np.random.default_rng(args.seed)
+
+        started = time.perf_counter()
+        balance = estimate(cast, players, rng=rng)
+        estimated = time.perf_counter() - started
+        rates = " ".join(
+            f"{endType.name}={rate:.3f}" for endType, rate in balance.rates.items()
+        )
+        print(
+            f"{players:>3} players: {balance.games} games in {estimated * 1000:.0f}ms"
+            f" ({rates})"
+        )
+
+        started = time.perf_counter()
+        found = suggest(cast, players, rng=rng)
+        suggested = time.perf_counter() - started
+        if found is None:
+            print(f"    suggest: none in {suggested * 1000:.0f}ms")
+        else:
+            candidate, balance = found
+            counts = " ".join(
+                f"{role.name}={count}" for role, count in candidate.items() if count
+            )
+            print(
+                f"    suggest: {counts} (villagers"
+                f" {balance.rates[EndType.WONVILAGGERS]:.3f})"
+                f" in {suggested * 1000:.0f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""WerewolfCog が使う discord.py のオブジェクトの代わり
+
+REST 呼び出しはすべて FakeHttp.request() を通り、ルートごとに回数と待ち時間を記録する。
+latency で 1 回あたりの遅延を、rateLimit で 429 が返る確率を決められる。
+429 は discord.py と同じく retry_after だけ待ってやり直す。
+"""
+
+import asyncio
+import itertools
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+# シャードの計算 (id >> 22) がばらけるように間隔をあける
+_ids = itertools.count(10**17, 1 << 22)
+
+
+def snowflake() -> int:
+    return next(_ids)
+
+
+class FakeHttp:
+    def __init__(
+        self,
+        latency: float = 0.05,
+        rateLimit: float = 0.0,
+        retryAfter: float = 0.5,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.rateLimit = rateLimit
+        self.retryAfter = retryAfter
+        self.rng = random.Random(seed)
+        self.calls: Counter = Counter()
+        self.limited: Counter = Counter()
+        self.seconds: Dict[str, float] = defaultdict(float)
+
+    async def request(self, route: str):
+        started = time.perf_counter()
+        self.calls[route] += 1
+        while self.rng.random() < self.rateLimit:
+            self.limited[route] += 1
+            await asyncio.sleep(self.retryAfter)
+        await asyncio.sleep(self.latency)
+        self.seconds[route] += time.perf_counter() - started
+
+    def reset(self):
+        self.calls.clear()
+        self.limited.clear()
+        self.seconds.clear()
+
+
+class FakeRole:
+    def __init__(self, http: FakeHttp, guild: "FakeGuild", name: str):
+        self.http = http
+        self.guild = guild
+        self.id = snowflake()
+        self.name = name
+        self.permissions = None
+
+    async def edit(self, permissions=None, **kwargs):
+        await self.http.request("PATCH /guilds/{guild_id}/roles/{role_id}")
+        self.permissions = permissions
+
+
+class FakeMessage:
+    def __init__(self, http: FakeHttp, channel: "FakeChannel", content: str, view):
+        self.http = http
+        self.channel = channel
+        self.id = snowflake()
+        self.content = content
+        self.view = view
+
+    async def edit(self, content: Optional[str] = None, **kwargs):
+        await self.http.request("PATCH /channels/{channel_id}/messages/{message_id}")
+        if content is not None:
+            self.content = content
+
+
+class FakeChannel:
+    def __init__(self, http: FakeHttp, guild: "FakeGuild", name: str, overwrites=None):
+        self.http = http
+        self.guild = guild
+        self.id = snowflake()
+        self.name = name
+        self.position = len(guild.channels)
+        self.overwrites = dict(overwrites or {})
+        self.messages: List[FakeMessage] = []
+        self.members: List["FakeMember"] = []
+        guild.channels.append(self)
+
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+
+    async def send(self, content: Optional[str] = None, view=None, **kwargs):
+        await self.http.request("POST /channels/{channel_id}/messages")
+        message = FakeMessage(self.http, self, content, view)
+        self.messages.append(message)
+        return message
+
+    async def edit(self, overwrites=None, **kwargs):
+        await self.http.request("PATCH /channels/{channel_id}")
+        if overwrites is not None:
+            self.overwrites = dict(overwrites)
+
+    async def purge(self, limit=None, **kwargs):
+        await self.http.request("GET /channels/{channel_id}/messages")
+        if self.messages:
+            await self.http.request("POST /channels/{channel_id}/messages/bulk-delete")
+        deleted, self.messages = self.messages, []
+        return deleted
+
+    async def delete(self, **kwargs):
+        await self.http.request("DELETE /channels/{channel_id}")
+        self.guild.channels.remove(self)
+
+
+class FakeVoiceChannel(FakeChannel):
+    pass
+
+
+class FakeTextChannel(FakeChannel):
+    pass
+
+
+class FakeCategory(FakeChannel):
+    @property
+    def channels(self) -> List[FakeChannel]:
+        return [c for c in self.guild.channels if getattr(c, "category", None) is self]
+
+    async def _create(self, cls, name: str, overwrites=None):
+        await self.http.request("POST /guilds/{guild_id}/channels")
+        channel = cls(self.http, self.guild, name, overwrites)
+        channel.category = self
+        return channel
+
+    async def create_voice_channel(self, name: str, overwrites=None, **kwargs):
+        return await self._create(FakeVoiceChannel, name, overwrites)
+
+    async def create_text_channel(self, name: str, overwrites=None, **kwargs):
+        return await self._create(FakeTextChannel, name, overwrites)
+
+
+class FakeVoiceState:
+    def __init__(self, channel: FakeVoiceChannel):
+        self.channel = channel
+        self.mute = False
+
+
+class FakeMember:
+    def __init__(self, http: FakeHttp, guild: "FakeGuild", name: str):
+        self.http = http
+        self.guild = guild
+        self.id = snowflake()
+        self.name = name
+        self.display_name = name
+        self.mention = f"<@{self.id}>"
+        self.roles: List[FakeRole] = []
+        self.voice: Optional[FakeVoiceState] = None
+        self.guild_permissions = SimpleNamespace(administrator=False)
+        guild.members.append(self)
+
+    def __eq__(self, other):
+        return getattr(other, "id", None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def connect(self, channel: FakeVoiceChannel):
+        """ゲートウェイ経由の入室 (REST は使わない)"""
+        self.voice = FakeVoiceState(channel)
+        channel.members.append(self)
+
+    async def edit(
+        self,
+        mute: Optional[bool] = None,
+        voice_channel: Optional[FakeVoiceChannel] = None,
+        **kwargs,
+    ):
+        await self.http.request("PATCH /guilds/{guild_id}/members/{user_id}")
+        if self.voice is None:
+            raise RuntimeError("Target user is not connected to voice.")
+        if mute is not None:
+            self.voice.mute = mute
+        if voice_channel is not None:
+            self.voice.channel.members.remove(self)
+            self.voice.channel = voice_channel
+            voice_channel.members.append(self)
+
+    async def move_to(self, channel: Optional[FakeVoiceChannel], **kwargs):
+        await self.http.request("PATCH /guilds/{guild_id}/members/{user_id}")
+        if self.voice is None:
+            raise RuntimeError("Target user is not connected to voice.")
+        self.voice.channel.members.remove(self)
+        if channel is None:
+            self.voice = None
+            return
+        self.voice.channel = channel
+        channel.members.append(self)
+
+
+class FakeGuild:
+    def __init__(self, http: FakeHttp):
+        self.http = http
+        self.id = snowflake()
+        self.channels: List[FakeChannel] = []
+        self.members: List[FakeMember] = []
+        self.roles: List[FakeRole] = []
+        self.default_role = self.createRole("@everyone")
+
+    def createRole(self, name: str) -> FakeRole:
+        role = FakeRole(self.http, self, name)
+        self.roles.append(role)
+        return role
+
+    def get_role(self, roleId: int) -> Optional[FakeRole]:
+        return next((r for r in self.roles if r.id == roleId), None)
+
+    def get_channel(self, channelId: int) -> Optional[FakeChannel]:
+        return next((c for c in self.channels if c.id == channelId), None)
+
+    def get_member(self, memberId: int) -> Optional[FakeMember]:
+        return next((m for m in self.members if m.id == memberId), None)
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+        self.done = False
+
+    async def send_message(self, content: Optional[str] = None, **kwargs):
+        await self.interaction.http.request(
+            "POST /interactions/{interaction_id}/{token}/callback"
+        )
+        self.done = True
+        self.interaction.replies.append(content)
+
+    def is_done(self) -> bool:
+        return self.done
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        await self.interaction.http.request("POST /webhooks/{id}/{token}")
+        self.interaction.replies.append(content)
+
+
+class FakeInteraction:
+    def __init__(self, http: FakeHttp, user: FakeMember, channel: FakeChannel):
+        self.http = http
+        self.user = user
+        self.guild = user.guild
+        self.guild_id = user.guild.id
+        self.channel = channel
+        self.channel_id = channel.id
+        self.created_at = datetime.now(timezone.utc)
+        self.replies: List[Optional[str]] = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+
+class FakeBot:
+    def __init__(self, *guilds: FakeGuild):
+        self.guilds = list(guilds)
+
+    def get_channel(self, channelId: int) -> Optional[FakeChannel]:
+        for guild in self.guilds:
+            channel = guild.get_channel(channelId)
+            if channel is not None:
+                return channel
+        return None
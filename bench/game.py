@@ -0,0 +1,155 @@
+"""偽の Discord 上で WerewolfCog にゲームを最後まで進めさせ、REST 呼び出しと時間を測る
+
+    python -m bench.game --players 5 15 50 --latency 0.05 --rate-limit 0.02
+
+フェーズの長さは 0 秒にするので、フェーズごとの時間は Bot 自身の処理と REST 呼び出しの時間になる。
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import cogs.werewolf as werewolf
+from bench.fakediscord import (
+    FakeBot,
+    FakeCategory,
+    FakeGuild,
+    FakeHttp,
+    FakeInteraction,
+    FakeMember,
+    FakeTextChannel,
+    FakeVoiceChannel,
+)
+from services.metrics import metrics
+from services.werewolf import Scene
+
+
+@dataclass
+class Report:
+    players: int
+    firstNight: float = 0
+    total: float = 0
+    # 結果の発表後に裏で行う後片付け
+    cleanup: float = 0
+    # (フェーズ, 処理にかかった秒数)
+    phases: List[Tuple[Scene, float]] = field(default_factory=list)
+    http: FakeHttp = None
+
+
+def castFor(players: int) -> Dict[str, int]:
+    return {
+        "werewolf": max(1, players // 5),
+        "teller": 1,
+        "knight": 1 if players >= 5 else 0,
+        "psychic": 1 if players >= 6 else 0,
+        "fox": 1 if players >= 12 else 0,
+    }
+
+
+async def runGame(players: int, http: FakeHttp) -> Report:
+    guild = FakeGuild(http)
+    lobby = FakeVoiceChannel(http, guild, "lobby")
+    notification = FakeTextChannel(http, guild, "notification")
+    category = FakeCategory(http, guild, "werewolf")
+    admin = guild.createRole("admin")
+    os.environ.update(
+        notificationChannel=str(notification.id),
+        lobbyChannel=str(lobby.id),
+        category=str(category.id),
+        adminRole=str(admin.id),
+        snapshotPath=":memory:",
+        replayDir=os.getenv("replayDir", tempfile.gettempdir()),
+    )
+
+    members = [FakeMember(http, guild, f"player{i}") for i in range(players)]
+    for member in members:
+        member.connect(lobby)
+    host = members[0]
+    host.guild_permissions.administrator = True
+    host.roles.append(admin)
+
+    cog = werewolf.WerewolfCog(FakeBot(guild))
+    await cog.on_ready()
+    session = cog.sessions.get(guild.id, lobby.id)
+    await cog.cast.callback(
+        cog, FakeInteraction(http, host, notification), **castFor(players)
+    )
+
+    report = Report(players=players, http=http)
+    marks: List[Tuple[Scene, float]] = []
+    waitPhase = cog.waitPhase
+
+    async def timedWaitPhase(session, label):
+        marks.append((session.scene, time.perf_counter()))
+        return await waitPhase(session, label)
+
+    cog.waitPhase = timedWaitPhase
+
+    http.reset()
+    started = time.perf_counter()
+    await cog.gameCommand.callback(cog, FakeInteraction(http, host, notification))
+    finished = time.perf_counter()
+    await asyncio.gather(*cog.background, session.pool.releasing)
+    await cog.outbox.flush()
+    await cog.history.close()
+    report.cleanup = time.perf_counter() - finished
+
+    report.total = finished - started
+    report.firstNight = marks[0][1] - started if marks else report.total
+    # 各フェーズの処理時間 = 前のフェーズの待ちが終わってから次の待ちが始まるまで
+    for (scene, at), (_, nextAt) in zip(marks, marks[1:] + [(None, finished)]):
+        report.phases.append((scene, nextAt - at))
+    assert not session.inGame
+    return report
+
+
+def show(report: Report):
+    http = report.http
+    print(f"== {report.players} players ==")
+    print(f"/game -> first night: {report.firstNight:.3f}s")
+    print(f"whole game:           {report.total:.3f}s ({len(report.phases)} phases)")
+    print(f"background cleanup:   {report.cleanup:.3f}s")
+    byScene: Dict[Scene, List[float]] = defaultdict(list)
+    for scene, seconds in report.phases:
+        byScene[scene].append(seconds)
+    for scene, seconds in byScene.items():
+        print(
+            f"  {scene.name:>7}: {sum(seconds) / len(seconds):.3f}s avg x{len(seconds)}"
+        )
+    print(f"REST calls: {sum(http.calls.values())} (429: {sum(http.limited.values())})")
+    for route, count in http.calls.most_common():
+        print(
+            f"  {count:>5} {http.limited[route]:>4} "
+            f"{http.seconds[route] / count * 1000:>7.1f}ms  {route}"
+        )
+    print()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[5, 15, 50])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--metrics", action="store_true")
+    args = parser.parse_args()
+
+    for scene in werewolf.PHASE_SECONDS:
+        werewolf.PHASE_SECONDS[scene] = 0
+
+    for players in args.players:
+        http = FakeHttp(args.latency, args.rate_limit, args.retry_after, args.seed)
+        show(await runGame(players, http))
+
+    if args.metrics:
+        print(metrics.render())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
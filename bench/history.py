@@ -0,0 +1,127 @@
+"""戦績を大量に書き込み、/stats の集計にかかる時間を測る
+
+python -m bench.history --games 100000 --players 15
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+from services.engine import EndType, NightResult, Role, VoteResult, deal
+from services.history import GameRecord, HistoryStore
+
+# 戦績を持つプレイヤーの人数 (ゲームごとにこの中から選ぶ)
+POPULATION = 2000
+
+CASTS = [
+    {Role.WEREWOLF: 2, Role.TELLER: 1, Role.KNIGHT: 1},
+    {Role.WEREWOLF: 3, Role.TELLER: 1, Role.KNIGHT: 1, Role.PSYCHIC: 1, Role.FOX: 1},
+    {Role.WEREWOLF: 2, Role.MADMAN: 1, Role.TELLER: 1, Role.BAKERY: 1},
+]
+
+
+def fakeRecord(rng: random.Random, players: int) -> GameRecord:
+    """それらしい死亡と投票を持つ記録を作る (ルールどおりに進めたものではない)"""
+    cast = rng.choice(CASTS)
+    seats = deal(rng.sample(range(1, POPULATION + 1), players), cast, rng)
+    record = GameRecord(0, 0, time.time(), cast, seats)
+    alive = [player for player, _ in seats]
+    day = 0
+    while len(alive) > 3:
+        executed = rng.choice(alive)
+        alive.remove(executed)
+        record.result(
+            day,
+            VoteResult(
+                votes={voter: rng.choice(alive) for voter in alive},
+                randomVoters=[],
+                executed=executed,
+                role=Role.VILLAGER,
+                tie=False,
+                endType=EndType.NOTEND,
+                deaths=[executed],
+            ),
+        )
+        victim = rng.choice(alive)
+        alive.remove(victim)
+        record.result(
+            day,
+            NightResult(
+                victim=victim,
+                randomKill=False,
+                guarded=False,
+                tellings={},
+                endType=EndType.NOTEND,
+                deaths=[victim],
+            ),
+        )
+        day += 1
+    record.end(rng.choice([EndType.WONWOLFS, EndType.WONVILAGGERS, EndType.WONFOX]))
+    return record
+
+
+async def run(args: argparse.Namespace, path: str):
+    rng = random.Random(args.seed)
+    history = HistoryStore(path, window=0)
+
+    # 1秒間に終わるゲームの記録を submit() する想定で、batch 件ずつ書く
+    started = time.perf_counter()
+    for start in range(0, args.games, args.batch):
+        for _ in range(min(args.batch, args.games - start)):
+            history.submit(fakeRecord(rng, args.players))
+        await history.flush()
+    elapsed = time.perf_counter() - started
+    print(
+        f"write: {args.games} games in {elapsed:.2f}s"
+        f" ({args.games / elapsed:.0f} games/s, batch {args.batch})"
+    )
+
+    # 1回 submit() するのにかかる時間 (イベントループが止まる時間)
+    record = fakeRecord(rng, args.players)
+    at = time.perf_counter()
+    history.submit(record)
+    print(f"submit: {(time.perf_counter() - at) * 1e6:.1f}us")
+    await history.flush()
+
+    players = rng.sample(range(1, POPULATION + 1), args.queries)
+    timings: List[float] = []
+    for player in players:
+        at = time.perf_counter()
+        await history.playerStats(player)
+        timings.append(time.perf_counter() - at)
+    timings.sort()
+    print(
+        f"player stats: median {timings[len(timings) // 2] * 1000:.2f}ms,"
+        f" max {timings[-1] * 1000:.2f}ms"
+    )
+
+    timings = []
+    for cast in CASTS:
+        at = time.perf_counter()
+        await history.castStats(cast, args.players)
+        timings.append(time.perf_counter() - at)
+    print(f"cast stats: max {max(timings) * 1000:.2f}ms")
+
+    await history.close()
+    print(f"database: {os.path.getsize(path) / 2**20:.1f}MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--players", type=int, default=15)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(args, os.path.join(directory, "history.db")))
+
+
+if __name__ == "__main__":
+    main()
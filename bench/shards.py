@@ -0,0 +1,132 @@
+"""偽の Discord で、ギルドをシャードごとにプロセスへ分けてゲームを同時に回す
+
+    python -m bench.shards --guilds 16 --shards 4 --processes 1 2 4
+
+各プロセスは自分のシャードのギルドだけを受け取り (偽のゲートウェイ)、
+途中経過とロビーの担当は同じ SQLite ファイル (WAL) に書く。
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import cogs.werewolf as werewolf
+from bench.fakediscord import (
+    FakeBot,
+    FakeCategory,
+    FakeGuild,
+    FakeHttp,
+    FakeInteraction,
+    FakeMember,
+    FakeTextChannel,
+    FakeVoiceChannel,
+)
+from bench.game import castFor
+from services.shards import assign, shardOf
+
+
+def makeGuild(http: FakeHttp, players: int) -> Tuple[FakeGuild, List[int]]:
+    guild = FakeGuild(http)
+    lobby = FakeVoiceChannel(http, guild, "lobby")
+    notification = FakeTextChannel(http, guild, "notification")
+    category = FakeCategory(http, guild, "werewolf")
+    admin = guild.createRole("admin")
+    members = [FakeMember(http, guild, f"player{i}") for i in range(players)]
+    for member in members:
+        member.connect(lobby)
+    members[0].guild_permissions.administrator = True
+    members[0].roles.append(admin)
+    return guild, [notification.id, lobby.id, category.id, admin.id]
+
+
+async def runShard(
+    shardIds: List[int], args: argparse.Namespace, store: str
+) -> Tuple[int, int]:
+    for scene in werewolf.PHASE_SECONDS:
+        werewolf.PHASE_SECONDS[scene] = 0
+
+    # ギルドはすべてのプロセスで同じ順番に作り、自分のシャードの分だけを残す
+    http = FakeHttp(args.latency)
+    guilds = []
+    ids: List[List[int]] = []
+    for _ in range(args.guilds):
+        guild, channelIds = makeGuild(http, args.players)
+        if shardOf(guild.id, args.shards) in shardIds:
+            guilds.append(guild)
+            ids.append(channelIds)
+    if not guilds:
+        return 0, 0
+
+    for name, values in zip(
+        ("notificationChannel", "lobbyChannel", "category", "adminRole"),
+        zip(*ids),
+    ):
+        os.environ[name] = ",".join(map(str, values))
+    os.environ["snapshotPath"] = store
+    os.environ["shardCount"] = str(args.shards)
+    os.environ["shardIds"] = ",".join(map(str, shardIds))
+    os.environ["replayDir"] = os.path.join(os.path.dirname(store), "replays")
+
+    cog = werewolf.WerewolfCog(FakeBot(*guilds))
+    await cog.on_ready()
+
+    async def play(guild: FakeGuild, notificationId: int):
+        host = guild.members[0]
+        notification = guild.get_channel(notificationId)
+        await cog.cast.callback(
+            cog, FakeInteraction(http, host, notification), **castFor(args.players)
+        )
+        for _ in range(args.games):
+            await cog.gameCommand.callback(
+                cog, FakeInteraction(http, host, notification)
+            )
+
+    await asyncio.gather(
+        *[play(guild, channelIds[0]) for guild, channelIds in zip(guilds, ids)]
+    )
+    await asyncio.gather(*cog.background)
+    await cog.outbox.flush()
+    await cog.history.close()
+    cog.heartbeat.cancel()
+    return len(guilds) * args.games, sum(http.calls.values())
+
+
+def worker(job: Tuple[List[int], argparse.Namespace, str]) -> Tuple[int, int]:
+    return asyncio.run(runShard(*job))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=16)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--players", type=int, default=15)
+    parser.add_argument("--games", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    for processes in args.processes:
+        with tempfile.TemporaryDirectory() as directory:
+            store = os.path.join(directory, "werewolf.db")
+            jobs = [
+                (shardIds, args, store)
+                for shardIds in assign(args.shards, min(processes, args.shards))
+            ]
+            started = time.perf_counter()
+            with ProcessPoolExecutor(len(jobs)) as executor:
+                results = list(executor.map(worker, jobs))
+            elapsed = time.perf_counter() - started
+        games = sum(games for games, _ in results)
+        calls = sum(calls for _, calls in results)
+        print(
+            f"{processes} processes: {games} games in {elapsed:.2f}s"
+            f" ({games / elapsed:.1f} games/s, {calls} REST calls)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,39 @@
 import asyncio
-import enum
 import os
 import random
+import time
 import traceback
 from collections import Counter
-from typing import Awaitable, Callable, List
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
 import discord
 import dotenv
 from discord import app_commands
 from discord.ext import commands
 
+from services.balance import Balance, estimate, suggest as suggestCast
+from services.countdown import Countdown
+from services.engine import deal
+from services.history import GameRecord, HistoryStore, recordFromLog
+from services.memory import memoryReport, residentBytes
+from services.metrics import currentPhase, metrics
+from services.mover import failureReport, moveAll
+from services.options import Pages
+from services.outbox import Outbox
+from services.pool import ChannelPool
+from services.provision import ProvisionError, gatherBounded, withRetry
+from services.replay import GameLog, readLog
+from services.shards import OWNER_TTL, ShardRegistry
+from services.snapshot import GUARD, KILL, TELL, VOTE, Snapshot, SnapshotStore
 from services.werewolf import (
-    Game,
+    EndType,
+    GameSession,
     Member,
+    NightResult,
     Role,
-    RoleType,
     Scene,
+    VoteResult,
+    SessionRegistry,
     getRoleName,
     getRoleType,
 )
@@ -24,13 +41,18 @@ from services.werewolf import (
 dotenv.load_dotenv()
 
 
-class EndType(enum.Enum):
-    FORCE = "FORCE"
-    NOTEND = "NOTEND"
-    WONWOLFS = "WONWOLF"
-    WONVILAGGERS = "WONVILAGGERS"
-    WONFOX = "WONFOX"
+# 各フェーズの長さ (秒)
+PHASE_SECONDS = {
+    Scene.DAY: 240,
+    Scene.EVENING: 60,
+    Scene.NIGHT: 120,
+}
+
+# 夜の行動が揃ってから夜を終えるまでの猶予 (秒)
+NIGHT_GRACE_SECONDS = 5
 
+# 投票済みの人数を表示し直す間隔 (秒)
+TALLY_SECONDS = 5
 
 ENDCHAR = {
     EndType.FORCE: "強制終了しました",
@@ -39,34 +61,82 @@ ENDCHAR = {
     EndType.WONFOX: "妖狐が生き残っていたため、妖狐の勝利！",
 }
 
+# /stats で表示する勝った陣営
+WINNER_NAMES = {
+    EndType.WONVILAGGERS: "村人",
+    EndType.WONWOLFS: "人狼",
+    EndType.WONFOX: "妖狐",
+}
+
+
+def castText(cast: Dict[Role, int]) -> str:
+    return " ".join(
+        f"{getRoleName(role)}{count}" for role, count in cast.items() if count
+    )
+
+
+def ratesText(balance: Balance, cast: Dict[Role, int]) -> str:
+    """陣営ごとの勝率 (妖狐がいない配役では妖狐を出さない)"""
+    return " / ".join(
+        f"{name} {balance.rates[endType]:.0%}"
+        for endType, name in WINNER_NAMES.items()
+        if endType != EndType.WONFOX or cast.get(Role.FOX)
+    )
+
 
-async def voteCallback(interaction: discord.Interaction, to: discord.Member):
+async def voteCallback(
+    session: GameSession, interaction: discord.Interaction, to: discord.Member
+):
     if to == interaction.user:
         return await interaction.response.send_message(
             f"自分自身には投票できません", ephemeral=True
         )
-    Game.votes[interaction.user] = to
+    if not session.engine.vote(interaction.user.id, to.id):
+        return await interaction.response.send_message(
+            f"投票できません", ephemeral=True
+        )
+    session.record(VOTE, interaction.user.id, to.id)
+    # 全員が投票したか、残りの票で結果が変わらなくなったら締め切る
+    if session.engine.voteDecided():
+        session.endPhase()
     await interaction.response.send_message(
         f"{to.mention} に投票しました。", ephemeral=True
     )
 
 
-async def tellerCallback(interaction: discord.Interaction, to: discord.Member):
-    Game.tellerTarget[interaction.user] = to
+def checkNight(session: GameSession):
+    """夜の行動が揃ったら、猶予をおいて夜を終わらせる"""
+    if session.engine.nightDone():
+        session.endPhase(NIGHT_GRACE_SECONDS)
+
+
+async def tellerCallback(
+    session: GameSession, interaction: discord.Interaction, to: discord.Member
+):
+    session.engine.chooseTeller(interaction.user.id, to.id)
+    session.record(TELL, interaction.user.id, to.id)
+    checkNight(session)
     await interaction.response.send_message(f"占う人を {to.mention} にしました。")
 
 
-async def knightCallback(interaction: discord.Interaction, to: discord.Member):
-    Game.knightTarget[interaction.user] = to
+async def knightCallback(
+    session: GameSession, interaction: discord.Interaction, to: discord.Member
+):
+    session.engine.chooseGuard(interaction.user.id, to.id)
+    session.record(GUARD, interaction.user.id, to.id)
+    checkNight(session)
     await interaction.response.send_message(f"守る人を {to.mention} にしました。")
 
 
-async def werewolfCallback(interaction: discord.Interaction, to: discord.Member):
-    if discord.utils.get(Game.members, member=to).role == Role.WEREWOLF:
+async def werewolfCallback(
+    session: GameSession, interaction: discord.Interaction, to: discord.Member
+):
+    if not session.engine.chooseKill(to.id):
         return await interaction.response.send_message(
             f"人狼は殺れません", ephemeral=True
         )
-    Game.werewolfTarget = to
+    session.record(KILL, 0, to.id)
+    checkNight(session)
     await interaction.response.send_message(f"{to.mention} を殺ります")
 
 
@@ -75,39 +145,48 @@ class UserSelect(discord.ui.Select):
         self,
         day: int,
         scene: Scene,
-        callback: Callable[[discord.Interaction, discord.Member], Awaitable[None]],
-        options: List[discord.SelectOption] = None,
+        session: GameSession,
+        callback: Callable[
+            [GameSession, discord.Interaction, discord.Member], Awaitable[None]
+        ],
+        options: List[discord.SelectOption],
+        placeholder: str = "ユーザーを選んでください。",
     ):
-        options = options or [
-            discord.SelectOption(
-                label=member.member.display_name,
-                value=member.member.id,
-                description="このユーザーを選びます",
-            )
-            for member in Game.members
-        ]
+        self.session = session
         self.day = day
         self.scene = scene
         self.selectCallback = callback
 
         super().__init__(
-            placeholder="ユーザーを選んでください。",
+            placeholder=placeholder,
             min_values=1,
             max_values=1,
             options=options,
         )
 
     async def callback(self, interaction: discord.Interaction):
-        if Game.days != self.day:
+        session = self.session
+        if session.days != self.day:
             return await interaction.response.send_message(
                 "今日のパネルではありません", ephemeral=True
             )
-        if Game.scene != self.scene:
+        if session.scene != self.scene:
             return await interaction.response.send_message(
                 "今のパネルではありません", ephemeral=True
             )
-        to = discord.utils.get(interaction.guild.members, id=int(self.values[0]))
-        await self.selectCallback(interaction, to)
+        # ゲームの参加者だけを ID で引く (ギルドの全メンバーは探さない)
+        target = session.get(int(self.values[0]))
+        if target is None:
+            return await interaction.response.send_message(
+                "このユーザーはゲームに参加していません", ephemeral=True
+            )
+        await self.selectCallback(session, interaction, target.member)
+        # 操作してから応答を返すまでの時間
+        metrics.observe(
+            "select_response_seconds",
+            (discord.utils.utcnow() - interaction.created_at).total_seconds(),
+            purpose=self.selectCallback.__name__,
+        )
 
 
 class UserSelectView(discord.ui.View):
@@ -115,401 +194,595 @@ class UserSelectView(discord.ui.View):
         self,
         day: int,
         scene: Scene,
+        session: GameSession,
         callback: Callable[
-            [discord.Interaction, discord.Member], Awaitable[None]
+            [GameSession, discord.Interaction, discord.Member], Awaitable[None]
         ] = voteCallback,
-        options: List[discord.SelectOption] = None,
+        pages: Optional[Pages] = None,
     ):
         super().__init__()
-        self.add_item(UserSelect(day, scene, callback, options))
+        # 25人を超えるときはメニューを分ける
+        pages = pages or session.options.pages("このユーザーを選びます")
+        for i, options in enumerate(pages):
+            placeholder = "ユーザーを選んでください。"
+            if len(pages) > 1:
+                placeholder += f" ({i + 1}/{len(pages)})"
+            self.add_item(
+                UserSelect(day, scene, session, callback, options, placeholder)
+            )
+
+
+def envIds(name: str) -> List[int]:
+    """カンマ区切りの環境変数をIDのリストとして読み込む"""
+    return [int(v) for v in os.getenv(name, "").split(",") if v.strip()]
 
 
 class WerewolfCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.notificationChannel: discord.VoiceChannel = None
-        self.lobbyChannel: discord.VoiceChannel = None
-        self.werewolfChannel: discord.VoiceChannel = None
-        self.ghostChannel: discord.TextChannel = None
-        self.category: discord.CategoryChannel = None
-        self.countMessage: discord.Message = None
-        self.adminRole: discord.Role = None
-
-    @commands.Cog.listener()
-    async def on_ready(self):
-        self.notificationChannel = self.bot.get_channel(
-            int(os.getenv("notificationChannel"))
+        self.sessions = SessionRegistry()
+        self.store = SnapshotStore(os.getenv("snapshotPath", "werewolf.db"))
+        # 終わったゲームの戦績 (既定では途中経過と同じファイルに書く)
+        self.history = HistoryStore(
+            os.getenv("historyPath", os.getenv("snapshotPath", "werewolf.db"))
         )
-        self.lobbyChannel = self.bot.get_channel(int(os.getenv("lobbyChannel")))
-        self.category = self.bot.get_channel(int(os.getenv("category")))
-
-        self.adminRole = self.lobbyChannel.guild.get_role(int(os.getenv("adminRole")))
-
-        for member in self.lobbyChannel.members:
-            Game.entries.append(member)
-
-    async def moveToRoleVoice(self):
-        for member in Game.members:
-            try:
-                dmember = member.member
-                if member.role == Role.WEREWOLF:
-                    await dmember.move_to(discord.utils.get(Game.channels, name="人狼"))
-                else:
-                    await dmember.move_to(
-                        discord.utils.get(Game.channels, name=str(dmember.id))
-                    )
-            except Exception as e:
-                traceback.print_exc()
-                await self.notificationChannel.send(f"エラーが発生しました: {e}")
-            finally:
-                await asyncio.sleep(0.05)
-
-    async def moveToLobby(self):
-        for member in Game.members:
-            try:
-                dmember = member.member
-                await dmember.move_to(self.lobbyChannel)
-            except Exception as e:
-                traceback.print_exc()
-                await self.notificationChannel.send(f"エラーが発生しました: {e}")
-            finally:
-                await asyncio.sleep(0.05)
-
-    async def addGhostMember(self, member: discord.Member):
-        overwrites = self.ghostChannel.overwrites
-        overwrites.update(
-            {member: discord.PermissionOverwrite(view_channel=True, send_messages=True)}
+        # シャードに分けて動かすとき (shardCount があるとき) は、ロビーを担当するプロセスを1つに決める
+        self.registry: Optional[ShardRegistry] = None
+        if os.getenv("shardCount"):
+            self.registry = ShardRegistry(os.getenv("snapshotPath", "werewolf.db"))
+        self.heartbeat: Optional[asyncio.Task] = None
+        # ほかのプロセスが担当中だったロビー (lobbyId → openLobby() の引数)
+        self.unclaimed: Dict[int, Tuple[int, int, int, int]] = {}
+        # 裏で走らせているタスク (再開したゲーム・後片付け)
+        self.background: Set[asyncio.Task] = set()
+        # テキストの送信はチャンネルごとにまとめる
+        self.outbox = Outbox()
+        self.metricsTasks: List[asyncio.Task] = []
+        metrics.gauge("games_active", lambda: sum(s.inGame for s in self.sessions))
+        metrics.gauge(
+            "players_active",
+            lambda: sum(len(s.members) for s in self.sessions if s.inGame),
         )
-        await self.ghostChannel.edit(overwrites=overwrites)
-        await member.edit(mute=True)
+        metrics.gauge("resident_memory_bytes", residentBytes)
 
-    def ifEnd(self):
-        werewolf = len(
-            [m for m in Game.members if m.role == Role.WEREWOLF and not m.dead]
-        )
-        villagers = len(
-            [m for m in Game.members if m.roleType == RoleType.VILLAGER and not m.dead]
-        )
-        foxies = len([m for m in Game.members if m.role == Role.FOX and not m.dead])
+    def startMetrics(self):
+        """metricsPort / metricsInterval が設定されていれば集計の出力を始める"""
+        if self.metricsTasks:
+            return
+        if os.getenv("metricsPort"):
+            self.metricsTasks.append(
+                asyncio.create_task(metrics.serve(port=int(os.getenv("metricsPort"))))
+            )
+        if os.getenv("metricsInterval"):
+            self.metricsTasks.append(
+                asyncio.create_task(metrics.dump(float(os.getenv("metricsInterval"))))
+            )
 
-        # 村人の勝利か・妖狐の勝利か
-        if werewolf == 0:
-            if foxies > 0:
-                return EndType.WONFOX
-            else:
-                return EndType.WONVILAGGERS
+    async def beat(self):
+        while True:
+            await asyncio.sleep(OWNER_TTL / 3)
+            self.registry.heartbeat()
+            # 担当していたプロセスの heartbeat が切れていれば引き継ぐ
+            for ids in list(self.unclaimed.values()):
+                await self.openLobby(*ids)
+
+    async def cog_unload(self):
+        if self.heartbeat is not None:
+            self.heartbeat.cancel()
+        if self.registry is not None:
+            self.registry.release()
+        await self.history.close()
 
-        # 人狼の勝利か・妖狐の勝利か
-        if villagers <= werewolf:
-            if foxies > 0:
-                return EndType.WONFOX
-            else:
-                return EndType.WONWOLFS
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.startMetrics()
+        if self.registry is not None and self.heartbeat is None:
+            self.heartbeat = asyncio.create_task(self.beat())
+        # ロビーごとに notificationChannel / category / adminRole を同じ順番で並べる
+        for ids in zip(
+            envIds("notificationChannel"),
+            envIds("lobbyChannel"),
+            envIds("category"),
+            envIds("adminRole"),
+        ):
+            await self.openLobby(*ids)
+
+    async def openLobby(
+        self, notificationId: int, lobbyId: int, categoryId: int, adminRoleId: int
+    ):
+        # ほかのシャードのギルドのチャンネルは見えない
+        lobbyChannel = self.bot.get_channel(lobbyId)
+        if lobbyChannel is None:
+            return
+        if self.registry is not None and not self.registry.claim(
+            lobbyChannel.guild.id, lobbyId
+        ):
+            if lobbyId not in self.unclaimed:
+                print(f"lobby {lobbyId} is handled by another process")
+            self.unclaimed[lobbyId] = (notificationId, lobbyId, categoryId, adminRoleId)
+            return
+        self.unclaimed.pop(lobbyId, None)
+        session = self.sessions.open(lobbyChannel.guild.id, lobbyId)
+        if session.inGame:
+            return
 
-        return EndType.NOTEND
+        session.lobbyChannel = lobbyChannel
+        session.notificationChannel = self.bot.get_channel(notificationId)
+        session.category = self.bot.get_channel(categoryId)
+        if session.pool is None:
+            session.pool = ChannelPool(session.category, lobbyId)
+        session.store = self.store
+        session.adminRole = lobbyChannel.guild.get_role(adminRoleId)
+        self.sessions.bind(session, notificationId)
+
+        snapshot = self.store.load(session.guildId, session.lobbyId)
+        if snapshot is not None:
+            return await self.resume(session, snapshot)
+
+        for member in lobbyChannel.members:
+            session.entries.setdefault(member.id, member)
+
+    async def resume(self, session: GameSession, snapshot: Snapshot):
+        """再起動前に進行していたゲームを読み戻し、中断したフェーズの残り時間から続ける"""
+        guild = session.lobbyChannel.guild
+        members: List[Member] = []
+        privateChannels = {}
+        try:
+            for seat in snapshot.seats:
+                member = guild.get_member(seat.player) or await guild.fetch_member(
+                    seat.player
+                )
+                channel = self.bot.get_channel(seat.channel)
+                if channel is None:
+                    raise LookupError(seat.channel)
+                members.append(
+                    Member(
+                        member=member,
+                        role=seat.role,
+                        roleType=getRoleType(seat.role),
+                        dead=not seat.alive,
+                    )
+                )
+                privateChannels[member.id] = channel
+            werewolfChannel = self.bot.get_channel(snapshot.werewolfChannel)
+            ghostChannel = self.bot.get_channel(snapshot.ghostChannel)
+            if werewolfChannel is None or ghostChannel is None:
+                raise LookupError(snapshot.werewolfChannel, snapshot.ghostChannel)
+        except (discord.HTTPException, LookupError):
+            traceback.print_exc()
+            self.store.delete(session)
+            self.outbox.post(
+                session.notificationChannel,
+                "再起動前のゲームを復元できなかったため、ゲームを中止しました",
+            )
+            await self.unlockLobby(session)
+            await session.adminRole.edit(
+                permissions=discord.Permissions(administrator=True)
+            )
+            return
 
-    async def end(self, endType: EndType):
-        await self.notificationChannel.send(ENDCHAR[endType])
-        await self.notificationChannel.send(
-            "\n".join(
-                [
-                    f"- {member.member.mention} -> {getRoleName(member.role)}"
-                    for member in Game.members
-                ]
+        session.inGame = True
+        # 再起動前の乱数の状態は残っていないので、新しいシードをログに書いて続ける
+        seed = random.getrandbits(64)
+        session.seat(members, random.Random(seed))
+        snapshot.restore(session.engine)
+        if snapshot.log is not None:
+            session.log = GameLog(snapshot.log)
+            session.history = recordFromLog(
+                readLog(snapshot.log), session.guildId, session.lobbyId
             )
+        else:
+            session.log = GameLog(os.devnull)
+        if session.history is None:
+            # ログがなければ、配役と死亡者だけを記録する (死んだ日と死因は分からない)
+            session.history = GameRecord(
+                session.guildId,
+                session.lobbyId,
+                0,
+                dict(Counter(seat.role for seat in snapshot.seats)),
+                [(seat.player, seat.role) for seat in snapshot.seats],
+                {
+                    seat.player: (None, None)
+                    for seat in snapshot.seats
+                    if not seat.alive
+                },
+            )
+        session.log.resume(seed)
+        session.werewolfChannel = werewolfChannel
+        session.ghostChannel = ghostChannel
+        session.privateChannels = privateChannels
+        session.channels = [werewolfChannel, ghostChannel, *privateChannels.values()]
+        for channel in session.channels:
+            self.sessions.bind(session, channel.id)
+
+        self.outbox.post(
+            session.notificationChannel,
+            "再起動したため、中断したところからゲームを再開します。",
+        )
+        self.spawn(self.game(session, snapshot.deadline))
+
+    def spawn(self, coro: Awaitable[None]) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+        return task
+
+    def sessionFor(self, interaction: discord.Interaction) -> Optional[GameSession]:
+        # コマンドを実行したチャンネル → 参加中のボイスチャンネル → ギルド内の唯一のロビー
+        session = self.sessions.byChannel(interaction.channel_id)
+        if session is not None:
+            return session
+
+        voice = getattr(interaction.user, "voice", None)
+        if voice and voice.channel:
+            session = self.sessions.byChannel(voice.channel.id)
+            if session is not None:
+                return session
+
+        sessions = self.sessions.forGuild(interaction.guild_id)
+        if len(sessions) == 1:
+            return sessions[0]
+        return None
+
+    async def moveToRoleVoice(self, session: GameSession):
+        await self.moveMembers(
+            session,
+            [
+                (
+                    member.member,
+                    (
+                        session.werewolfChannel
+                        if member.role == Role.WEREWOLF
+                        else session.privateChannels[member.member.id]
+                    ),
+                )
+                for member in session.members
+            ],
         )
 
-        for member in Game.members:
-            dmember = member.member
-            await dmember.edit(mute=False)
-            if dmember.voice and dmember.voice.mute:
-                await dmember.move_to(self.lobbyChannel)
+    async def moveToLobby(self, session: GameSession):
+        await self.moveMembers(
+            session,
+            [(member.member, session.lobbyChannel) for member in session.members],
+        )
 
-        await self.lobbyChannel.edit(
+    async def moveMembers(
+        self,
+        session: GameSession,
+        moves: List[Tuple[discord.Member, Optional[discord.VoiceChannel]]],
+    ):
+        failures = await moveAll(moves)
+        if failures:
+            for _, e in failures:
+                traceback.print_exception(e)
+            self.outbox.post(session.notificationChannel, failureReport(failures))
+
+    async def addGhostMember(self, session: GameSession, member: discord.Member):
+        overwrites = session.ghostChannel.overwrites
+        overwrites.update(
+            {member: discord.PermissionOverwrite(view_channel=True, send_messages=True)}
+        )
+        await session.ghostChannel.edit(overwrites=overwrites)
+        await member.edit(mute=True)
+
+    async def unlockLobby(self, session: GameSession):
+        await session.lobbyChannel.edit(
             overwrites={
-                self.lobbyChannel.guild.default_role: discord.PermissionOverwrite(
+                session.lobbyChannel.guild.default_role: discord.PermissionOverwrite(
                     view_channel=True, connect=True, speak=True
                 ),
             }
         )
 
-        for channel in Game.channels:
-            await channel.delete()
-        self.werewolfChannel = None
-        self.ghostChannel = None
-
-        await self.adminRole.edit(permissions=discord.Permissions(administrator=True))
-        Game.reset()
-
-    async def game(self):
-        match Game.scene:
-            case Scene.DAY:
-                Game.seconds = 240
-                await self.moveToLobby()
-
-                if (
-                    len(
-                        [
-                            member.member
-                            for member in Game.members
-                            if member.role == Role.BAKERY and not member.dead
-                        ]
-                    )
-                    > 0
-                ):
-                    await self.notificationChannel.send(
-                        "パン屋が美味しいパンを焼いてくれました！"
-                    )
+    async def abortSetup(
+        self, session: GameSession, entries: Dict[int, discord.Member], message: str
+    ):
+        """ゲームの準備に失敗したとき、/game の前の状態に戻す"""
+        self.outbox.post(session.notificationChannel, message)
+        session.entries = entries
+        if session.log is not None:
+            session.log.close()
+            session.log = None
+        session.history = None
+        session.seat([])
+        session.inGame = False
+        try:
+            await self.unlockLobby(session)
+            await session.adminRole.edit(
+                permissions=discord.Permissions(administrator=True)
+            )
+        except discord.HTTPException:
+            traceback.print_exc()
+
+    async def end(self, session: GameSession, endType: EndType):
+        # 結果の発表・ロビーと管理者ロールの復旧までを待ち、残りは裏で片付ける
+        currentPhase.set("teardown")
+        self.store.delete(session)
+        session.log.end(endType)
+        session.history.end(endType)
+        self.history.submit(session.history)
+        self.outbox.post(session.notificationChannel, ENDCHAR[endType])
+        self.outbox.post(
+            session.notificationChannel,
+            "\n".join(
+                [
+                    f"- {member.member.mention} -> {getRoleName(member.role)}"
+                    for member in session.members
+                ]
+            ),
+        )
 
-                self.countMessage = await self.notificationChannel.send(
-                    f"昼が終わるまで: 残り{Game.seconds}秒"
-                )
-                while Game.seconds > 0:
-                    Game.seconds -= 1
-                    await asyncio.sleep(1)
-                    await self.countMessage.edit(
-                        content=f"昼が終わるまで: 残り{Game.seconds}秒"
-                    )
-                    if Game.force:
-                        return await self.end(EndType.FORCE)
-                Game.scene = Scene.EVENING
-                await self.game()
-            case Scene.EVENING:
-                Game.seconds = 60
-                self.countMessage = await self.notificationChannel.send(
-                    f"夕方が終わるまで: 残り{Game.seconds}秒"
+        await asyncio.gather(
+            self.unlockLobby(session),
+            withRetry(
+                lambda: session.adminRole.edit(
+                    permissions=discord.Permissions(administrator=True)
                 )
+            ),
+        )
 
-                for member in Game.members:
-                    if not member.dead:
-                        Game.votes[member.member] = None
-
-                await self.notificationChannel.send(
-                    "夕方になりました。投票を開始してください。",
-                    view=UserSelectView(
-                        Game.days,
-                        Game.scene,
-                        voteCallback,
-                        [
-                            discord.SelectOption(
-                                label=member.member.display_name,
-                                value=member.member.id,
-                                description="このユーザーに投票します",
-                            )
-                            for member in Game.members
-                            if not member.dead
-                        ],
-                    ),
-                )
+        members = [member.member for member in session.members]
+        channels = session.channels
+        for channel in channels:
+            self.sessions.unbind(channel.id)
+        session.reset()
+        # 移動で戻ってくるメンバーは on_voice_state_update で加わる
+        for member in session.lobbyChannel.members:
+            session.entries.setdefault(member.id, member)
 
-                while Game.seconds > 0:
-                    Game.seconds -= 1
-                    await asyncio.sleep(1)
-                    await self.countMessage.edit(
-                        content=f"夕方が終わるまで: 残り{Game.seconds}秒"
-                    )
-                    if Game.force:
-                        return await self.end(EndType.FORCE)
-
-                v = Game.votes.copy()
-                for m in v.keys():
-                    if Game.votes[m] is None:
-                        Game.votes[m] = random.choice(
-                            [
-                                member.member
-                                for member in Game.members
-                                if member.member != m
-                            ]
-                        )
+        session.pool.releaseInBackground(channels)
+        self.spawn(self.cleanup(session, members, channels))
 
-                await self.notificationChannel.send(
-                    "\n".join(
-                        [
-                            f"- {member.mention} -> {to.mention}"
-                            for member, to in Game.votes.items()
-                        ]
-                    )
-                    + "\n-# 選ばなかったユーザーはランダム投票になります"
+    async def cleanup(
+        self,
+        session: GameSession,
+        members: List[discord.Member],
+        channels: List[discord.abc.GuildChannel],
+    ):
+        """ミュートを外し、ゲーム用チャンネルに残っているメンバーをロビーに戻す"""
+        currentPhase.set("cleanup")
+
+        async def restore(member: discord.Member):
+            if member.voice is None:
+                return
+            if member.voice.channel in channels:
+                await withRetry(
+                    lambda: member.edit(mute=False, voice_channel=session.lobbyChannel)
                 )
-                valueCounts = Counter(Game.votes.values())
-                mostCommon = valueCounts.most_common()
-
-                if len(mostCommon) > 1 and mostCommon[0][1] == mostCommon[1][1]:
-                    voteMember = random.choice(
-                        [
-                            member
-                            for member, cnt in mostCommon
-                            if cnt == mostCommon[0][1]
-                        ]
-                    )
-                    char = "\n-# ※全て同数だったためランダム投票となります"
-                else:
-                    voteMember, count = mostCommon[0]
-                    char = ""
+            else:
+                await withRetry(lambda: member.edit(mute=False))
 
-                await self.notificationChannel.send(
-                    f"{voteMember.mention} さんが最多票を得たため、処刑します。" + char
+        results = await gatherBounded([restore(member) for member in members])
+        failures = [
+            (member, e)
+            for member, e in zip(members, results)
+            if isinstance(e, BaseException)
+        ]
+        if failures:
+            for _, e in failures:
+                traceback.print_exception(e)
+            self.outbox.post(session.notificationChannel, failureReport(failures))
+        print(memoryReport(self.bot.guilds))
+
+    async def waitPhase(self, session: GameSession, label: str) -> bool:
+        """締め切りか session.endPhase() まで待ち、強制終了されたかを返す"""
+        # ためてあるテキストをカウントダウンより先に出す
+        await self.outbox.flush(session.notificationChannel)
+        countdown = Countdown(
+            session.notificationChannel, label, session.seconds, session.deadline
+        )
+        session.countMessage = await countdown.start()
+        render = asyncio.create_task(countdown.run())
+        try:
+            await asyncio.wait_for(
+                session.phaseDone.wait(), max(0, session.deadline - time.time())
+            )
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            render.cancel()
+        await countdown.finish()
+        return session.force
+
+    async def showTally(
+        self, session: GameSession, message: discord.Message, content: str
+    ):
+        """投票済みの人数を TALLY_SECONDS ごとに、変わったときだけ書き換える"""
+        shown = 0
+        while True:
+            await asyncio.sleep(TALLY_SECONDS)
+            engine = session.engine
+            voted = len(engine.votes) - engine.pending
+            if voted != shown:
+                shown = voted
+                await message.edit(
+                    content=f"{content}\n-# 投票済み {voted}/{len(engine.votes)}人"
                 )
-                discord.utils.get(Game.members, member=voteMember).dead = True
-                await self.addGhostMember(voteMember)
-
-                for member in Game.members:
-                    dmember = member.member
-                    if member.role == Role.PSYCHIC:
-                        await discord.utils.get(
-                            Game.channels, name=str(dmember.id)
-                        ).send(
-                            f"{voteMember.mention} さんは**{getRoleName(discord.utils.get(Game.members, member=voteMember).role)}**でした。",
-                        )
 
-                endType = self.ifEnd()
-                if endType != EndType.NOTEND:
-                    return await self.end(endType)
-
-                Game.scene = Scene.NIGHT
-                await self.game()
-            case Scene.NIGHT:
-                Game.seconds = 120
-
-                # 自分のボイスチャンネルor人狼ボイスチャンネルに移動
-                await self.moveToRoleVoice()
-
-                for member in Game.members:
-                    dmember = member.member
-                    if member.role == Role.WEREWOLF:
-                        continue
-
-                    match member.role:
-                        case Role.TELLER:
-                            await discord.utils.get(
-                                Game.channels, name=str(dmember.id)
-                            ).send(
-                                "占うユーザーを選択してください。",
-                                view=UserSelectView(
-                                    Game.days,
-                                    Game.scene,
-                                    tellerCallback,
-                                    [
-                                        discord.SelectOption(
-                                            label=member.member.display_name,
-                                            value=member.member.id,
-                                            description="このユーザーを占います",
-                                        )
-                                        for member in Game.members
-                                        if member.member != dmember and not member.dead
-                                    ],
-                                ),
-                            )
-                        case Role.KNIGHT:
-                            await discord.utils.get(
-                                Game.channels, name=str(dmember.id)
-                            ).send(
-                                "守るユーザーを選択してください。",
-                                view=UserSelectView(
-                                    Game.days,
-                                    Game.scene,
-                                    knightCallback,
-                                    [
-                                        discord.SelectOption(
-                                            label=member.member.display_name,
-                                            value=member.member.id,
-                                            description="このユーザーを守ります",
-                                        )
-                                        for member in Game.members
-                                        if member.member != dmember and not member.dead
-                                    ],
-                                ),
+    async def game(self, session: GameSession, deadline: Optional[float] = None):
+        # ルールの処理は session.engine に任せ、ここでは Discord への反映だけを行う
+        # 各フェーズは締め切りかイベント (強制終了・行動の完了) で終わる
+        # deadline を渡すと、最初のフェーズをその時刻まで続ける (再起動からの再開)
+        while True:
+            currentPhase.set(session.scene.name)
+            session.startPhase(PHASE_SECONDS[session.scene], deadline)
+            self.store.savePhase(session)
+            with metrics.time("phase_seconds", scene=session.scene.name):
+                match session.scene:
+                    case Scene.DAY:
+                        await self.moveToLobby(session)
+
+                        if session.countAlive(role=Role.BAKERY) > 0:
+                            self.outbox.post(
+                                session.notificationChannel,
+                                "パン屋が美味しいパンを焼いてくれました！",
                             )
 
-                await self.werewolfChannel.send(
-                    f"夜になりました。仲間と話し合って、村人を一人噛み殺してください。{'(初日は誰も噛み殺せません)' if Game.days == 0 else ''}",
-                    view=(
-                        UserSelectView(
-                            Game.days,
-                            Game.scene,
-                            werewolfCallback,
-                            [
-                                discord.SelectOption(
-                                    label=member.member.display_name,
-                                    value=member.member.id,
-                                    description="このユーザーを噛み殺します",
-                                )
-                                for member in Game.members
-                                if member.role != Role.WEREWOLF and not member.dead
-                            ],
+                        if await self.waitPhase(session, "昼"):
+                            return await self.end(session, EndType.FORCE)
+                        session.engine.startEvening()
+                        session.log.phase(session.scene)
+                    case Scene.EVENING:
+                        content = "夕方になりました。投票を開始してください。"
+                        panel = await self.outbox.send(
+                            session.notificationChannel,
+                            content,
+                            view=UserSelectView(
+                                session.days,
+                                session.scene,
+                                session,
+                                voteCallback,
+                                session.options.pages("このユーザーに投票します"),
+                            ),
                         )
-                        if Game.days != 0
-                        else None
-                    ),
-                )
 
-                self.countMessage = await self.notificationChannel.send(
-                    f"夜が終わるまで: 残り{Game.seconds}秒"
-                )
+                        tally = asyncio.create_task(
+                            self.showTally(session, panel, content)
+                        )
+                        try:
+                            force = await self.waitPhase(session, "夕方")
+                        finally:
+                            tally.cancel()
+                        if force:
+                            return await self.end(session, EndType.FORCE)
+
+                        day = session.days
+                        result = session.engine.resolveVotes()
+                        session.apply(result)
+                        session.log.result(result)
+                        session.history.result(day, result)
+                        self.store.saveResult(session, result)
+                        await self.announceVotes(session, result)
+                        if result.endType != EndType.NOTEND:
+                            return await self.end(session, result.endType)
+                    case Scene.NIGHT:
+                        # 夜の途中からの再開でなければ夜を始める (deadline が 0 なら始まる前)
+                        if not deadline:
+                            session.engine.startNight()
+                            session.log.phase(session.scene)
+
+                        # 自分のボイスチャンネルor人狼ボイスチャンネルに移動
+                        await self.moveToRoleVoice(session)
+
+                        for member in session.withRole(Role.TELLER) + session.withRole(
+                            Role.KNIGHT
+                        ):
+                            dmember = member.member
+                            match member.role:
+                                case Role.TELLER:
+                                    await self.outbox.send(
+                                        session.privateChannels[dmember.id],
+                                        "占うユーザーを選択してください。",
+                                        view=UserSelectView(
+                                            session.days,
+                                            session.scene,
+                                            session,
+                                            tellerCallback,
+                                            session.options.pages(
+                                                "このユーザーを占います",
+                                                viewer=dmember.id,
+                                            ),
+                                        ),
+                                    )
+                                case Role.KNIGHT:
+                                    await self.outbox.send(
+                                        session.privateChannels[dmember.id],
+                                        "守るユーザーを選択してください。",
+                                        view=UserSelectView(
+                                            session.days,
+                                            session.scene,
+                                            session,
+                                            knightCallback,
+                                            session.options.pages(
+                                                "このユーザーを守ります",
+                                                viewer=dmember.id,
+                                            ),
+                                        ),
+                                    )
+
+                        await self.outbox.send(
+                            session.werewolfChannel,
+                            f"夜になりました。仲間と話し合って、村人を一人噛み殺してください。{'(初日は誰も噛み殺せません)' if session.days == 0 else ''}",
+                            view=(
+                                UserSelectView(
+                                    session.days,
+                                    session.scene,
+                                    session,
+                                    werewolfCallback,
+                                    session.options.pages(
+                                        "このユーザーを噛み殺します",
+                                        exclude=Role.WEREWOLF,
+                                    ),
+                                )
+                                if session.days != 0
+                                else None
+                            ),
+                        )
 
-                while Game.seconds > 0:
-                    Game.seconds -= 1
-                    await asyncio.sleep(1)
-                    await self.countMessage.edit(
-                        content=f"夜が終わるまで: 残り{Game.seconds}秒"
-                    )
-                    if Game.force:
-                        return await self.end(EndType.FORCE)
+                        if await self.waitPhase(session, "夜"):
+                            return await self.end(session, EndType.FORCE)
+
+                        day = session.days
+                        result = session.engine.resolveNight()
+                        session.apply(result)
+                        session.log.result(result)
+                        session.history.result(day, result)
+                        self.store.saveResult(session, result)
+                        await self.announceNight(session, result)
+                        if result.endType != EndType.NOTEND:
+                            return await self.end(session, result.endType)
+            deadline = None
+
+    async def announceVotes(self, session: GameSession, result: VoteResult):
+        self.outbox.post(
+            session.notificationChannel,
+            "\n".join(
+                [
+                    f"- {session.get(voter).member.mention} -> {session.get(to).member.mention}"
+                    for voter, to in result.votes.items()
+                ]
+            )
+            + "\n-# 選ばなかったユーザーはランダム投票になります",
+        )
 
-                # 人狼がターゲットを選択しなかった場合
-                if not Game.werewolfTarget:
-                    await self.werewolfChannel.send(
-                        "選択されなかったため、ランダムに噛み殺します。"
-                    )
-                    Game.werewolfTarget = random.choice(
-                        [
-                            member.member
-                            for member in Game.members
-                            if not member.dead and member.role != Role.WEREWOLF
-                        ]
-                    )
+        executed = session.get(result.executed).member
+        char = "\n-# ※全て同数だったためランダム投票となります" if result.tie else ""
+        self.outbox.post(
+            session.notificationChannel,
+            f"{executed.mention} さんが最多票を得たため、処刑します。" + char,
+        )
+        await self.addGhostMember(session, executed)
 
-                # 占い師の処理
-                for teller, target in Game.tellerTarget.items():
-                    if not target:
-                        continue
-
-                    if (
-                        discord.utils.get(Game.members, member=target).roleType
-                        == RoleType.WEREWOLF
-                    ):
-                        char = f"{target.mention} は人狼です"
-                    else:
-                        char = f"{target.mention} は人狼ではありません"
-
-                    await discord.utils.get(
-                        Game.channels,
-                        name=str(teller.id),
-                    ).send(char)
-
-                # 騎士の処理(騎士が守れなかった場合は殺害処理)
-                if Game.days > 0:
-                    if Game.werewolfTarget in Game.knightTarget.values():
-                        await self.notificationChannel.send(
-                            "騎士が人狼から村人を守った！"
-                        )
-                    else:
-                        discord.utils.get(
-                            Game.members, member=Game.werewolfTarget
-                        ).dead = True
-                        await self.addGhostMember(Game.werewolfTarget)
+        for member in session.withRole(Role.PSYCHIC):
+            self.outbox.post(
+                session.privateChannels[member.member.id],
+                f"{executed.mention} さんは**{getRoleName(result.role)}**でした。",
+            )
 
-                Game.werewolfTarget = None
-                Game.knightTarget = {}
-                Game.tellerTarget = {}
+    async def announceNight(self, session: GameSession, result: NightResult):
+        # 人狼がターゲットを選択しなかった場合
+        if result.randomKill:
+            self.outbox.post(
+                session.werewolfChannel,
+                "選択されなかったため、ランダムに噛み殺します。",
+            )
 
-                endType = self.ifEnd()
-                if endType != EndType.NOTEND:
-                    return await self.end(endType)
+        # 占い師の処理
+        for teller, (target, isWerewolf) in result.tellings.items():
+            mention = session.get(target).member.mention
+            if isWerewolf:
+                char = f"{mention} は人狼です"
+            else:
+                char = f"{mention} は人狼ではありません"
+            self.outbox.post(session.privateChannels[teller], char)
 
-                Game.scene = Scene.DAY
-                Game.days += 1
-                await self.game()
+        # 騎士の処理(騎士が守れなかった場合は殺害処理)
+        if result.guarded:
+            self.outbox.post(
+                session.notificationChannel, "騎士が人狼から村人を守った！"
+            )
+        for player in result.deaths:
+            await self.addGhostMember(session, session.get(player).member)
 
     @commands.Cog.listener()
     async def on_voice_state_update(
@@ -518,37 +791,23 @@ class WerewolfCog(commands.Cog):
         before: discord.VoiceState,
         after: discord.VoiceState,
     ):
-        if Game.inGame:
+        # ミュート・画面共有などチャンネルが変わらないイベントはすぐに返す
+        beforeId = before.channel.id if before.channel is not None else None
+        afterId = after.channel.id if after.channel is not None else None
+        if beforeId == afterId:
             return
 
-        # 監視対象のボイスチャンネルへの接続
-        if before.channel is None and after.channel is not None:
-            if after.channel.id == self.lobbyChannel.id:
-                if member not in Game.entries:
-                    Game.entries.append(member)
-
-        # 監視対象のボイスチャンネルからの切断
-        elif before.channel is not None and after.channel is None:
-            if before.channel.id == self.lobbyChannel.id:
-                if member.id in [member.id for member in Game.entries]:
-                    Game.entries.remove(member)
-
-        # 監視対象のボイスチャンネルから別のチャンネルへの移動、またはその逆
-        elif before.channel is not None and after.channel is not None:
-            # 監視対象のチャンネルから別のチャンネルへ移動
-            if (
-                before.channel.id == self.lobbyChannel.id
-                and after.channel.id != self.lobbyChannel.id
-            ):
-                if member.id in [member.id for member in Game.entries]:
-                    Game.entries.remove(member)
-            # 別のチャンネルから監視対象のチャンネルへ移動
-            elif (
-                before.channel.id != self.lobbyChannel.id
-                and after.channel.id == self.lobbyChannel.id
-            ):
-                if member not in Game.entries:
-                    Game.entries.append(member)
+        # 監視対象のボイスチャンネルからの切断・別のチャンネルへの移動
+        if beforeId is not None:
+            session = self.sessions.get(member.guild.id, beforeId)
+            if session is not None and not session.inGame:
+                session.entries.pop(member.id, None)
+
+        # 監視対象のボイスチャンネルへの接続・別のチャンネルからの移動
+        if afterId is not None:
+            session = self.sessions.get(member.guild.id, afterId)
+            if session is not None and not session.inGame:
+                session.entries.setdefault(member.id, member)
 
     @app_commands.command(name="cast", description="配役決めします")
     @app_commands.default_permissions(discord.Permissions(administrator=True))
@@ -560,7 +819,9 @@ class WerewolfCog(commands.Cog):
         werewolf="人狼",
         madman="狂人",
         fox="妖狐",
+        suggest="提案",
     )
+    @app_commands.describe(suggest="釣り合いに近い配役を探して提案します")
     async def cast(
         self,
         interaction: discord.Interaction,
@@ -571,11 +832,18 @@ class WerewolfCog(commands.Cog):
         werewolf: int = 0,
         madman: int = 0,
         fox: int = 0,
+        suggest: bool = False,
     ):
         if not interaction.user.guild_permissions.administrator:
             return
 
-        Game.cast = {
+        session = self.sessionFor(interaction)
+        if session is None:
+            return await interaction.response.send_message(
+                "ロビーが見つかりません", ephemeral=True
+            )
+
+        session.cast = {
             Role.KNIGHT: knight,
             Role.TELLER: teller,
             Role.PSYCHIC: psychic,
@@ -585,142 +853,269 @@ class WerewolfCog(commands.Cog):
             Role.FOX: fox,
         }
 
-        await interaction.response.send_message("配役を決めました")
+        # 今のエントリー数で遊べる配役なら勝率を見積もる (計算は別スレッドで行う)
+        players = len(session.entries)
+        if players <= 2 or werewolf < 1 or sum(session.cast.values()) > players:
+            return await interaction.response.send_message("配役を決めました")
+        cast = dict(session.cast)
+        with metrics.time("balance_seconds"):
+            balance = await asyncio.to_thread(estimate, cast, players)
+        await interaction.response.send_message(
+            f"配役を決めました\n-# {players}人での勝率の見積もり ({balance.games}回):"
+            f" {ratesText(balance, cast)}"
+        )
+
+        if suggest:
+            found = await asyncio.to_thread(suggestCast, cast, players)
+            if found is None:
+                content = "今の配役より釣り合う配役は見つかりませんでした"
+            else:
+                candidate, balance = found
+                content = (
+                    f"釣り合いに近い配役: {castText(candidate)}\n"
+                    f"-# {ratesText(balance, candidate)}"
+                )
+            await interaction.followup.send(content)
+
+    @app_commands.command(name="forceend", description="ゲームを強制終了します")
+    async def forceEndCommand(self, interaction: discord.Interaction):
+        # ゲーム中は adminRole の管理者権限を外しているので、
+        # default_permissions では絞らずにここでロールも確認する
+        session = self.sessionFor(interaction)
+        if session is None:
+            return await interaction.response.send_message(
+                "ロビーが見つかりません", ephemeral=True
+            )
+        if (
+            not interaction.user.guild_permissions.administrator
+            and session.adminRole not in interaction.user.roles
+        ):
+            return await interaction.response.send_message(
+                "強制終了する権限がありません", ephemeral=True
+            )
+
+        if not session.inGame:
+            return await interaction.response.send_message(
+                "ゲームが進行していません", ephemeral=True
+            )
+
+        session.forceEnd()
+        await interaction.response.send_message("強制終了します", ephemeral=True)
 
     @app_commands.command(name="entries", description="エントリー中のメンバーを確認")
     async def entriesCommand(self, interaction: discord.Interaction):
+        session = self.sessionFor(interaction)
+        if session is None:
+            return await interaction.response.send_message(
+                "ロビーが見つかりません", ephemeral=True
+            )
+
         await interaction.response.send_message(
-            " ".join([member.mention for member in Game.entries]), ephemeral=True
+            " ".join([member.mention for member in session.entries.values()]),
+            ephemeral=True,
         )
 
+    @app_commands.command(name="stats", description="戦績と今の配役の勝率を確認")
+    @app_commands.rename(user="ユーザー")
+    async def statsCommand(
+        self, interaction: discord.Interaction, user: Optional[discord.Member] = None
+    ):
+        user = user or interaction.user
+        stats = await self.history.playerStats(user.id)
+        games = sum(role.games for role in stats)
+        wins = sum(role.wins for role in stats)
+        if games:
+            lines = [
+                f"**{user.display_name}** の戦績: {games}戦{wins}勝 ({wins / games:.0%})"
+            ]
+            lines.extend(
+                f"- {getRoleName(role.role)}: {role.games}戦{role.wins}勝"
+                f" ({role.wins / role.games:.0%})"
+                for role in stats
+            )
+        else:
+            lines = [f"**{user.display_name}** の戦績はまだありません"]
+
+        session = self.sessionFor(interaction)
+        if session is not None and session.cast:
+            players = len(session.members) if session.inGame else len(session.entries)
+            winners = await self.history.castStats(session.cast, players)
+            total = sum(winners.values())
+            if total:
+                lines.append(
+                    f"今の配役 ({players}人: {castText(session.cast)}) の勝率 ({total}戦)"
+                )
+                lines.extend(
+                    f"- {name}: {winners.get(endType, 0) / total:.0%}"
+                    for endType, name in WINNER_NAMES.items()
+                )
+
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
     @app_commands.command(name="game", description="ゲームを開始します")
     @app_commands.default_permissions(discord.Permissions(administrator=True))
     async def gameCommand(self, interaction: discord.Interaction):
         if not interaction.user.guild_permissions.administrator:
             return
 
-        if len(Game.entries) <= 2:
+        session = self.sessionFor(interaction)
+        if session is None:
             return await interaction.response.send_message(
-                f"メンバーが足りません (あと{2 - len(Game.entries)}人)"
+                "ロビーが見つかりません", ephemeral=True
             )
 
-        # 役職の数が多すぎたとき
-        mCount = sum(Game.cast.values())
+        if session.inGame:
+            return await interaction.response.send_message(
+                "このロビーではゲームが進行中です", ephemeral=True
+            )
 
-        if mCount > len(Game.entries):
+        if len(session.entries) <= 2:
             return await interaction.response.send_message(
-                f"メンバーが足りません (あと{mCount - len(Game.entries)}人)"
+                f"メンバーが足りません (あと{2 - len(session.entries)}人)"
             )
 
-        await interaction.response.send_message("ok", ephemeral=True)
+        # 役職の数が多すぎたとき
+        mCount = sum(session.cast.values())
 
-        await self.adminRole.edit(permissions=discord.Permissions.none())
+        if mCount > len(session.entries):
+            return await interaction.response.send_message(
+                f"メンバーが足りません (あと{mCount - len(session.entries)}人)"
+            )
 
-        # 役職決め
-        for role, count in Game.cast.items():
-            members = random.sample(Game.entries, count)
-            for member in members:
-                Game.members.append(
-                    Member(member=member, role=role, roleType=getRoleType(role))
-                )
-                Game.entries.remove(member)
-        entries = Game.entries.copy()
-        for member in entries:
-            Game.members.append(
-                Member(
-                    member=member,
-                    role=Role.VILLAGER,
-                    roleType=getRoleType(Role.VILLAGER),
+        await interaction.response.send_message("ok", ephemeral=True)
+        session.inGame = True
+        currentPhase.set("setup")
+
+        # 途中で失敗したらエントリーを戻してロビーを開ける
+        entries = session.entries
+        try:
+            await session.adminRole.edit(permissions=discord.Permissions.none())
+
+            # 役職決め (乱数はゲームごとのシードから作り、リプレイログに残す)
+            seed = random.getrandbits(64)
+            rng = random.Random(seed)
+            session.seat(
+                [
+                    Member(
+                        member=entries[player], role=role, roleType=getRoleType(role)
+                    )
+                    for player, role in deal(list(entries), session.cast, rng)
+                ],
+                rng,
+            )
+            session.log = GameLog(
+                os.path.join(
+                    os.getenv("replayDir", "replays"),
+                    f"{session.guildId}-{session.lobbyId}-{int(time.time())}.jsonl",
                 )
             )
-            Game.entries.remove(member)
-        Game.members.sort(key=lambda m: m.roleType)
+            session.log.start(seed, list(entries), session.cast)
+            session.history = GameRecord(
+                session.guildId,
+                session.lobbyId,
+                time.time(),
+                dict(session.cast),
+                [(member.member.id, member.role) for member in session.members],
+            )
+            session.entries = {}
 
-        # ロビー
-        overwrites = {
-            interaction.guild.default_role: discord.PermissionOverwrite(
-                view_channel=False
-            ),
-        }
-        overwrites.update(
-            {
-                member.member: discord.PermissionOverwrite(
-                    view_channel=True, connect=True, speak=True, send_messages=True
-                )
-                for member in Game.members
+            # ロビー
+            overwrites = {
+                interaction.guild.default_role: discord.PermissionOverwrite(
+                    view_channel=False
+                ),
             }
-        )
-        await self.lobbyChannel.edit(
-            overwrites=overwrites,
-        )
+            overwrites.update(
+                {
+                    member.member: discord.PermissionOverwrite(
+                        view_channel=True, connect=True, speak=True, send_messages=True
+                    )
+                    for member in session.members
+                }
+            )
+            await session.lobbyChannel.edit(
+                overwrites=overwrites,
+            )
 
-        # 人狼
-        overwrites = {
-            interaction.guild.default_role: discord.PermissionOverwrite(
-                view_channel=False
-            ),
-        }
-        overwrites.update(
-            {
-                member.member: discord.PermissionOverwrite(
-                    view_channel=True,
-                    connect=True,
-                    speak=True,
-                    send_messages=True,
-                )
-                for member in Game.members
-                if member.role == Role.WEREWOLF
+            # 人狼
+            overwrites = {
+                interaction.guild.default_role: discord.PermissionOverwrite(
+                    view_channel=False
+                ),
             }
-        )
-        Game.channels.append(
-            channel := await self.category.create_voice_channel(
-                name="人狼",
-                overwrites=overwrites,
+            overwrites.update(
+                {
+                    member.member: discord.PermissionOverwrite(
+                        view_channel=True,
+                        connect=True,
+                        speak=True,
+                        send_messages=True,
+                    )
+                    for member in session.withRole(Role.WEREWOLF)
+                }
             )
-        )
-        self.werewolfChannel = channel
 
-        # 幽霊チャンネル
-        Game.channels.append(
-            channel := await self.category.create_text_channel(
-                name="霊界",
-                overwrites={
+            # 人狼・幽霊・各ユーザーのチャンネルを用意 (足りない分だけ作成)
+            werewolfChannel, ghostChannel, memberChannels = await session.pool.acquire(
+                overwrites,
+                {
                     interaction.guild.default_role: discord.PermissionOverwrite(
                         view_channel=False
                     ),
                 },
-            )
-        )
-        self.ghostChannel = channel
-
-        # 各ユーザーのチャンネル
-        for member in Game.members:
-            dmember = member.member
-            await dmember.edit(mute=False)
-            Game.channels.append(
-                channel := await self.category.create_voice_channel(
-                    name=str(dmember.id),
-                    overwrites={
+                [
+                    {
                         interaction.guild.default_role: discord.PermissionOverwrite(
                             view_channel=False
                         ),
-                        dmember: discord.PermissionOverwrite(
+                        member.member: discord.PermissionOverwrite(
                             view_channel=True, send_messages=True
                         ),
-                    },
-                )
+                    }
+                    for member in session.members
+                ],
+            )
+        except ProvisionError as e:
+            return await self.abortSetup(
+                session,
+                entries,
+                f"チャンネルの作成に失敗したため、ゲームを中止しました: {e}",
             )
-            await channel.send(f"あなたは**{getRoleName(member.role)}**です！")
+        except Exception as e:
+            traceback.print_exc()
+            return await self.abortSetup(
+                session,
+                entries,
+                f"ゲームの準備に失敗したため、ゲームを中止しました: {e}",
+            )
+
+        session.werewolfChannel = werewolfChannel
+        session.ghostChannel = ghostChannel
+        session.channels = [werewolfChannel, ghostChannel, *memberChannels]
+        session.privateChannels = {
+            member.member.id: channel
+            for member, channel in zip(session.members, memberChannels)
+        }
+        for channel in session.channels:
+            self.sessions.bind(session, channel.id)
+        self.store.saveGame(session)
 
-        await self.werewolfChannel.send(
-            f"あなたは**人狼**です！あなたの仲間は {' '.join([member.member.mention for member in Game.members
-                    if member.role == Role.WEREWOLF])} です。"
+        # ミュート解除と役職の通知を並列に送る
+        werewolves = " ".join(
+            [member.member.mention for member in session.withRole(Role.WEREWOLF)]
+        )
+        await gatherBounded(
+            [member.member.edit(mute=False) for member in session.members]
+        )
+        for member, channel in zip(session.members, memberChannels):
+            self.outbox.post(channel, f"あなたは**{getRoleName(member.role)}**です！")
+        self.outbox.post(
+            werewolfChannel, f"あなたは**人狼**です！あなたの仲間は {werewolves} です。"
         )
 
-        await self.notificationChannel.send("人狼ゲームを開始します。")
+        self.outbox.post(session.notificationChannel, "人狼ゲームを開始します。")
 
-        Game.inGame = True
-        await self.game()
+        await self.game(session)
 
 
 async def setup(bot: commands.Bot):
@@ -1,18 +1,73 @@
+import asyncio
+import contextlib
 import os
+import signal
+import time
 
-import discord
 import dotenv
 from discord.ext import commands
 
+from services.memory import cacheOptions, memoryReport
+from services.metrics import metrics
+from services.treesync import syncIfChanged
+
 dotenv.load_dotenv()
 
-bot = commands.Bot([], help_command=None, intents=discord.Intents.default())
+# shardCount があればシャードモードで起動する (shardIds はこのプロセスが受け持つシャード)
+shardCount = int(os.getenv("shardCount", "0"))
+shardIds = [int(v) for v in os.getenv("shardIds", "").split(",") if v.strip()]
+sharding = (
+    {"shard_count": shardCount, "shard_ids": shardIds or None} if shardCount else {}
+)
+
+bot = (commands.AutoShardedBot if shardCount else commands.Bot)(
+    [],
+    help_command=None,
+    **sharding,
+    # 既定ではボイスチャンネルにいるメンバーだけをキャッシュする
+    **cacheOptions(os.getenv("memberCache", "voice")),
+    http_trace=metrics.traceConfig(),
+)
+
+# 起動にかかった時間を測る基準
+started = time.perf_counter()
+readyAt = None
 
 
 @bot.event
 async def setup_hook():
+    # SIGTERM でも bot.close() から cog_unload を通して終わる (ロビーの担当を手放す)
+    with contextlib.suppress(NotImplementedError):
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM, lambda: asyncio.create_task(bot.close())
+        )
+
+    at = time.perf_counter()
     await bot.load_extension("cogs.werewolf")
-    await bot.tree.sync()
+    loaded = time.perf_counter()
+    print(f"extension loaded in {loaded - at:.3f}s")
+
+    # コマンドはグローバルなので、シャード 0 を持つプロセスだけが sync する
+    if shardCount and 0 not in (shardIds or [0]):
+        return
+
+    # コマンドの定義が前回の sync から変わったときだけ sync する
+    synced = await syncIfChanged(
+        bot.tree, bot.application_id, os.getenv("treeHashPath", ".treehash")
+    )
+    print(
+        f"command tree {'synced' if synced else 'unchanged, sync skipped'}"
+        f" in {time.perf_counter() - loaded:.3f}s"
+    )
+
+
+@bot.event
+async def on_ready():
+    global readyAt
+    if readyAt is None:
+        readyAt = time.perf_counter()
+        print(f"ready in {readyAt - started:.3f}s")
+        print(memoryReport(bot.guilds))
 
 
 bot.run(os.getenv("discord"))
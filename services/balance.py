@@ -0,0 +1,227 @@
+"""配役の勝率を NumPy でまとめてシミュレーションして見積もる
+
+Engine と同じルール (初日は噛めない・騎士の護衛・占い・同数ならランダム処刑・妖狐の勝利) で、
+プレイヤーは次のように動くものとする
+
+- 投票: 生きているほかの人からランダムに選ぶ。人狼は人狼には投票しない
+- 占い師が見つけた人狼が生きていれば、占い師が生きている間は村人陣営と妖狐はその人狼に投票する
+- 襲撃: 人狼以外の生存者からランダムに選ぶ
+- 占い・護衛: 自分以外の生存者からランダムに選ぶ
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.engine import EndType, Role, RoleType, getRoleType
+
+# 1回の見積もりでシミュレーションする ゲーム数 × 人数 (15人なら 10000 ゲーム)
+# 1日にかかる時間はこの積に比例するので、人数が多いときはゲーム数を減らす
+CELLS = 150000
+# 村人陣営の勝率がこの幅で 50% に入っていれば釣り合っているとみなす
+TOLERANCE = 0.05
+# 提案するときに増減を試す役職 (霊能者・パン屋はこのモデルでは村人と同じ)
+TUNABLE = (Role.WEREWOLF, Role.MADMAN, Role.FOX, Role.TELLER, Role.KNIGHT)
+
+# シミュレーション中の勝敗 (0 はまだ終わっていない)
+_WINNERS = (EndType.WONVILAGGERS, EndType.WONWOLFS, EndType.WONFOX)
+_VILLAGERS, _WOLVES, _FOX = 1, 2, 3
+
+
+@dataclass(slots=True)
+class Balance:
+    games: int
+    # 勝った陣営 → 割合
+    rates: Dict[EndType, float]
+
+    @property
+    def imbalance(self) -> float:
+        """村人陣営の勝率が 50% からどれだけ離れているか"""
+        return abs(self.rates[EndType.WONVILAGGERS] - 0.5)
+
+
+def gamesFor(players: int, cells: int = CELLS) -> int:
+    return max(cells // max(players, 1), 1)
+
+
+def seatsOf(cast: Dict[Role, int], players: int) -> List[Role]:
+    roles = [role for role, count in cast.items() for _ in range(count)]
+    return roles + [Role.VILLAGER] * (players - len(roles))
+
+
+def _order(alive: np.ndarray, isWolf: np.ndarray) -> np.ndarray:
+    """各ゲームのプレイヤーを 人狼以外の生存者・人狼の生存者・死亡者 の順に並べる"""
+    key = np.where(alive, isWolf.astype(np.int8), 2)
+    return np.argsort(key, axis=1, kind="stable")
+
+
+def _pickOther(
+    order: np.ndarray, aliveCount: np.ndarray, u: np.ndarray, players: np.ndarray
+) -> np.ndarray:
+    """players (列の番号) がそれぞれ自分以外の生存者からランダムに選んだ相手
+
+    生存者の先頭 aliveCount - 1 人から選び、自分を引いたら最後の生存者に置き換える
+    """
+    rows = np.arange(len(order))[:, None]
+    r = (u * np.maximum(aliveCount[:, None] - 1, 1)).astype(np.intp)
+    picked = order[rows, r]
+    last = order[rows, np.maximum(aliveCount[:, None] - 1, 0)]
+    return np.where(picked == players[None, :], last, picked)
+
+
+def estimate(
+    cast: Dict[Role, int],
+    players: int,
+    games: Optional[int] = None,
+    rng: Optional[np.random.Generator] = None,
+) -> Balance:
+    """games 回分のゲームを配列でまとめて進め、陣営ごとの勝率を返す"""
+    games = games or gamesFor(players)
+    rng = rng or np.random.default_rng()
+    roles = seatsOf(cast, players)
+    isWolf = np.array([role == Role.WEREWOLF for role in roles])
+    isVillager = np.array([getRoleType(role) == RoleType.VILLAGER for role in roles])
+    isFox = np.array([role == Role.FOX for role in roles])
+    # 占い師の結果を信じて投票する人
+    follows = isVillager | isFox
+    tellers = np.flatnonzero([role == Role.TELLER for role in roles])
+    knights = np.flatnonzero([role == Role.KNIGHT for role in roles])
+    everyone = np.arange(players)
+
+    def random(shape) -> np.ndarray:
+        return rng.random(shape, dtype=np.float32)
+
+    alive = np.ones((games, players), dtype=bool)
+    # 生きている占い師が見つけた人狼
+    found = np.zeros((games, players), dtype=bool)
+    # 終わったゲームは配列から外し、ids で元のゲームの番号を持つ
+    ids = np.arange(games)
+    winner = np.zeros(games, dtype=np.int8)
+
+    def tell(order, aliveCount):
+        for teller in tellers:
+            target = _pickOther(order, aliveCount, random((len(ids), 1)), teller[None])[
+                :, 0
+            ]
+            found[np.arange(len(ids)), target] |= alive[:, teller] & isWolf[target]
+
+    def judge():
+        nonlocal alive, found, ids
+        wolves = (alive & isWolf).sum(axis=1)
+        villagers = (alive & isVillager).sum(axis=1)
+        foxes = (alive & isFox).sum(axis=1)
+        ended = (wolves == 0) | (villagers <= wolves)
+        winner[ids[ended]] = np.where(
+            foxes[ended] > 0, _FOX, np.where(wolves[ended] == 0, _VILLAGERS, _WOLVES)
+        )
+        alive, found, ids = alive[~ended], found[~ended], ids[~ended]
+
+    # 初日の夜は占いだけ
+    order = _order(alive, isWolf)
+    tell(order, alive.sum(axis=1))
+
+    for _ in range(players):
+        # 夕方: 投票して最多票の人を処刑する (同数ならランダム)
+        n = len(ids)
+        rows = np.arange(n)
+        order = _order(alive, isWolf)
+        aliveCount = alive.sum(axis=1)
+        nonWolves = (alive & ~isWolf).sum(axis=1)
+        u = random((n, players))
+        targets = _pickOther(order, aliveCount, u, everyone)
+        wolfTargets = np.take_along_axis(
+            order, (u * nonWolves[:, None]).astype(np.intp), axis=1
+        )
+        targets = np.where(isWolf[None, :], wolfTargets, targets)
+        exposed = found & alive
+        trusted = exposed.any(axis=1) & alive[:, tellers].any(axis=1)
+        targets = np.where(
+            trusted[:, None] & follows[None, :],
+            exposed.argmax(axis=1)[:, None],
+            targets,
+        )
+        tally = np.bincount(
+            (rows[:, None] * players + targets)[alive], minlength=n * players
+        ).reshape(n, players)
+        executed = np.argmax(
+            np.where(tally > 0, tally + random((n, players)), -1), axis=1
+        )
+        alive[rows, executed] = False
+        judge()
+        if not len(ids):
+            break
+
+        # 夜: 占い・護衛・襲撃
+        n = len(ids)
+        rows = np.arange(n)
+        order = _order(alive, isWolf)
+        aliveCount = alive.sum(axis=1)
+        nonWolves = (alive & ~isWolf).sum(axis=1)
+        tell(order, aliveCount)
+        victim = order[rows, (random(n) * nonWolves).astype(np.intp)]
+        guarded = np.zeros(n, dtype=bool)
+        for knight in knights:
+            guard = _pickOther(order, aliveCount, random((n, 1)), knight[None])[:, 0]
+            guarded |= alive[:, knight] & (guard == victim)
+        alive[rows[~guarded], victim[~guarded]] = False
+        judge()
+        if not len(ids):
+            break
+
+    counts = np.bincount(winner, minlength=4)
+    finished = max(int(counts[1:].sum()), 1)
+    return Balance(
+        games=games,
+        rates={
+            endType: float(counts[code] / finished)
+            for code, endType in enumerate(_WINNERS, 1)
+        },
+    )
+
+
+def neighbors(cast: Dict[Role, int], players: int) -> List[Dict[Role, int]]:
+    """TUNABLE の役職を1つだけ1人増減した配役"""
+    result = []
+    for role in TUNABLE:
+        for delta in (-1, 1):
+            count = cast.get(role, 0) + delta
+            candidate = {**cast, role: count}
+            if count < 0 or sum(candidate.values()) > players:
+                continue
+            if candidate.get(Role.WEREWOLF, 0) < 1:
+                continue
+            result.append(candidate)
+    return result
+
+
+def suggest(
+    cast: Dict[Role, int],
+    players: int,
+    games: Optional[int] = None,
+    steps: int = 3,
+    rng: Optional[np.random.Generator] = None,
+) -> Optional[Tuple[Dict[Role, int], Balance]]:
+    """1人ずつ増減して釣り合いに近づく配役を探す (見つからなければ None)
+
+    候補が多いので、1つの配役あたりのゲーム数は estimate() の 1/5 にする
+    """
+    games = games or gamesFor(players, CELLS // 5)
+    rng = rng or np.random.default_rng()
+    current, best = cast, estimate(cast, players, games, rng)
+    for _ in range(steps):
+        if best.imbalance <= TOLERANCE:
+            break
+        candidates = [
+            (candidate, estimate(candidate, players, games, rng))
+            for candidate in neighbors(current, players)
+        ]
+        if not candidates:
+            break
+        candidate, balance = min(candidates, key=lambda c: c[1].imbalance)
+        if balance.imbalance >= best.imbalance:
+            break
+        current, best = candidate, balance
+    if current is cast:
+        return None
+    return current, best
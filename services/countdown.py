@@ -0,0 +1,81 @@
+import asyncio
+import math
+import time
+from typing import Optional, Set
+
+import discord
+
+from services.metrics import metrics
+
+# (この秒数より残りが多い間, この間隔で更新) の順に並べた更新スケジュール
+# 残り時間の細かい表示は Discord の相対タイムスタンプ (<t:...:R>) に任せる
+EDIT_STEPS = ((60, 60), (0, 10))
+
+
+def editPoints(seconds: int) -> Set[int]:
+    """メッセージを更新する残り秒数の集合を返す (0 は必ず含む)"""
+    points = {0}
+    for remaining in range(1, seconds):
+        for threshold, interval in EDIT_STEPS:
+            if remaining > threshold:
+                if remaining % interval == 0:
+                    points.add(remaining)
+                break
+    return points
+
+
+class Countdown:
+    """残り時間を表示するメッセージ。毎秒ではなくスケジュールに沿って更新する"""
+
+    def __init__(
+        self,
+        channel: discord.abc.Messageable,
+        label: str,
+        seconds: int,
+        deadline: Optional[float] = None,
+    ):
+        self.channel = channel
+        self.label = label
+        self.seconds = seconds
+        self.deadline = deadline or time.time() + seconds
+        self.points = editPoints(seconds)
+        self.message: discord.Message = None
+        # start() で表示した残り秒数
+        self.shown = seconds
+        self.edits = 0
+
+    def render(self, remaining: int) -> str:
+        if remaining <= 0:
+            return f"{self.label}が終わりました"
+        return (
+            f"{self.label}が終わるまで: 残り{remaining}秒 (<t:{int(self.deadline)}:R>)"
+        )
+
+    def remaining(self) -> int:
+        return max(0, math.ceil(self.deadline - time.time()))
+
+    async def start(self) -> discord.Message:
+        # 再開したフェーズや準備に時間がかかったフェーズでは、実際の残り時間から表示する
+        self.shown = self.remaining()
+        self.message = await self.channel.send(self.render(self.shown))
+        return self.message
+
+    async def update(self, remaining: int):
+        if remaining not in self.points:
+            return
+        self.points.discard(remaining)
+        self.edits += 1
+        with metrics.time("message_edit_seconds"):
+            await self.message.edit(content=self.render(remaining))
+
+    async def run(self):
+        """締め切りまでスケジュールに沿ってメッセージを更新する"""
+        for remaining in sorted(self.points, reverse=True):
+            # 表示した残り時間以上の更新点は過ぎているので、まとめて送らずに飛ばす
+            if remaining <= 0 or remaining >= self.shown:
+                continue
+            await asyncio.sleep(self.deadline - remaining - time.time())
+            await self.update(remaining)
+
+    async def finish(self):
+        await self.update(0)
@@ -0,0 +1,366 @@
+import enum
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# 役職
+class Role(enum.Enum):
+    # 村人陣営
+    VILLAGER = "VILLAGER"  # 村人
+    KNIGHT = "KNIGHT"  # 騎士
+    TELLER = "TELLER"  # 占い師
+    PSYCHIC = "PSYCHIC"  # 霊能者
+    BAKERY = "BAKERY"  # パン屋
+    # 人狼陣営
+    WEREWOLF = "WEREWOLF"  # 人狼
+    MADMAN = "MADMAN"  # 狂人
+    # 第三陣営
+    FOX = "FOX"  # 妖狐
+
+
+# 陣営
+class RoleType(enum.IntEnum):
+    VILLAGER = 0  # 村人
+    WEREWOLF = 1  # 人狼
+    OTHER = 2  # 第三陣営
+
+
+# 役職 → 陣営 の対応表
+ROLE_TO_TYPE = {
+    # 村人陣営
+    Role.VILLAGER: RoleType.VILLAGER,
+    Role.KNIGHT: RoleType.VILLAGER,
+    Role.TELLER: RoleType.VILLAGER,
+    Role.PSYCHIC: RoleType.VILLAGER,
+    Role.BAKERY: RoleType.VILLAGER,
+    # 人狼陣営
+    Role.WEREWOLF: RoleType.WEREWOLF,
+    Role.MADMAN: RoleType.WEREWOLF,
+    # 第三陣営
+    Role.FOX: RoleType.OTHER,
+}
+
+# 役職 → 名前 の対応表
+ROLE_TO_NAME = {
+    # 村人陣営
+    Role.VILLAGER: "村人",
+    Role.KNIGHT: "騎士",
+    Role.TELLER: "占い師",
+    Role.PSYCHIC: "霊能者",
+    Role.BAKERY: "パン屋",
+    # 人狼陣営
+    Role.WEREWOLF: "人狼",
+    Role.MADMAN: "狂人",
+    # 第三陣営
+    Role.FOX: "妖狐",
+}
+
+
+def getRoleType(role: Role) -> RoleType:
+    return ROLE_TO_TYPE[role]
+
+
+def getRoleName(role: Role) -> str:
+    return ROLE_TO_NAME[role]
+
+
+class Scene(enum.Enum):
+    NIGHT = "NIGHT"
+    DAY = "DAY"
+    EVENING = "EVENING"
+
+
+class EndType(enum.Enum):
+    FORCE = "FORCE"
+    NOTEND = "NOTEND"
+    WONWOLFS = "WONWOLF"
+    WONVILAGGERS = "WONVILAGGERS"
+    WONFOX = "WONFOX"
+
+
+@dataclass(slots=True)
+class VoteResult:
+    # 投票者 → 投票先 (投票しなかった人はランダムに埋めてある)
+    votes: Dict[int, int]
+    randomVoters: List[int]
+    executed: int
+    role: Role
+    tie: bool
+    endType: EndType
+    deaths: List[int] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class NightResult:
+    # 人狼が噛もうとした人 (初日は None)
+    victim: Optional[int]
+    randomKill: bool
+    guarded: bool
+    # 占い師 → (占った人, 人狼か)
+    tellings: Dict[int, Tuple[int, bool]]
+    endType: EndType
+    deaths: List[int] = field(default_factory=list)
+
+
+def deal(
+    players: Sequence[int], cast: Dict[Role, int], rng: random.Random
+) -> List[Tuple[int, Role]]:
+    """配役を決め、(プレイヤーID, 役職) を陣営順に並べて返す"""
+    # 一度だけシャッフルして前から順に役職を割り当てる
+    order = list(players)
+    rng.shuffle(order)
+    seats: List[Tuple[int, Role]] = []
+    start = 0
+    for role, count in cast.items():
+        seats.extend((player, role) for player in order[start : start + count])
+        start += count
+    seats.extend((player, Role.VILLAGER) for player in order[start:])
+    seats.sort(key=lambda seat: getRoleType(seat[1]))
+    return seats
+
+
+class Engine:
+    """discord に依存しないゲームのルール。プレイヤーは ID で扱う"""
+
+    def __init__(
+        self,
+        seats: Sequence[Tuple[int, Role]],
+        rng: Optional[random.Random] = None,
+    ):
+        self.rng = rng or random.Random()
+        self.players: List[int] = [player for player, _ in seats]
+        self.roles: Dict[int, Role] = dict(seats)
+        # プレイヤーID → players 内の位置 (ビット番号)
+        self.seatOf: Dict[int, int] = {}
+        # 生存者・役職・陣営をビットで持ち、死亡したときだけ更新する
+        self.aliveMask = 0
+        self.roleMasks: Dict[Role, int] = dict.fromkeys(Role, 0)
+        self.typeMasks: Dict[RoleType, int] = dict.fromkeys(RoleType, 0)
+        for i, (player, role) in enumerate(seats):
+            bit = 1 << i
+            self.seatOf[player] = i
+            self.aliveMask |= bit
+            self.roleMasks[role] |= bit
+            self.typeMasks[getRoleType(role)] |= bit
+
+        self.days = 0
+        self.scene = Scene.NIGHT
+        self.werewolfTarget: Optional[int] = None
+        self.tellerTarget: Dict[int, int] = {}
+        self.knightTarget: Dict[int, int] = {}
+        self.votes: Dict[int, Optional[int]] = {}
+        # 投票先 → 票数 と、まだ投票していない人数 (投票のたびに更新する)
+        self.tally: Counter = Counter()
+        self.pending = 0
+
+    # --- 状態 ---
+
+    def withRole(self, role: Role) -> List[int]:
+        return self.bits(self.roleMasks[role])
+
+    def alive(self, exclude: Optional[Role] = None) -> List[int]:
+        """生存者を席順に返す (exclude の役職は除く)"""
+        mask = self.aliveMask
+        if exclude is not None:
+            mask &= ~self.roleMasks[exclude]
+        return self.bits(mask)
+
+    def bits(self, mask: int) -> List[int]:
+        players = []
+        while mask:
+            low = mask & -mask
+            players.append(self.players[low.bit_length() - 1])
+            mask ^= low
+        return players
+
+    def isAlive(self, player: int) -> bool:
+        seat = self.seatOf.get(player)
+        return seat is not None and bool(self.aliveMask >> seat & 1)
+
+    def countAlive(
+        self, role: Optional[Role] = None, roleType: Optional[RoleType] = None
+    ) -> int:
+        mask = self.aliveMask
+        if role is not None:
+            mask &= self.roleMasks[role]
+        if roleType is not None:
+            mask &= self.typeMasks[roleType]
+        return mask.bit_count()
+
+    def kill(self, player: int):
+        self.aliveMask &= ~(1 << self.seatOf[player])
+
+    def judge(self) -> EndType:
+        werewolf = self.countAlive(role=Role.WEREWOLF)
+        villagers = self.countAlive(roleType=RoleType.VILLAGER)
+        foxies = self.countAlive(role=Role.FOX)
+
+        # 村人の勝利か・妖狐の勝利か
+        if werewolf == 0:
+            if foxies > 0:
+                return EndType.WONFOX
+            else:
+                return EndType.WONVILAGGERS
+
+        # 人狼の勝利か・妖狐の勝利か
+        if villagers <= werewolf:
+            if foxies > 0:
+                return EndType.WONFOX
+            else:
+                return EndType.WONWOLFS
+
+        return EndType.NOTEND
+
+    # --- 昼・夕方 ---
+
+    def startDay(self):
+        self.scene = Scene.DAY
+
+    def startEvening(self):
+        self.scene = Scene.EVENING
+        self.votes = dict.fromkeys(self.alive())
+        self.tally = Counter()
+        self.pending = len(self.votes)
+
+    def vote(self, voter: int, target: int) -> bool:
+        if voter not in self.votes or voter == target or not self.isAlive(target):
+            return False
+        previous = self.votes[voter]
+        if previous is None:
+            self.pending -= 1
+        else:
+            self.tally[previous] -= 1
+            if not self.tally[previous]:
+                del self.tally[previous]
+        self.votes[voter] = target
+        self.tally[target] += 1
+        return True
+
+    def voteDecided(self) -> bool:
+        """全員が投票したか、残りの票が全部2位に入っても処刑される人が変わらないか"""
+        if self.pending == 0:
+            return True
+        top = self.tally.most_common(2)
+        if not top:
+            return False
+        second = top[1][1] if len(top) > 1 else 0
+        return top[0][1] > second + self.pending
+
+    def resolveVotes(self) -> VoteResult:
+        # 選ばなかったユーザーは自分以外の生存者にランダム投票
+        randomVoters = [voter for voter, target in self.votes.items() if target is None]
+        alive = self.alive()
+        for voter in randomVoters:
+            target = self.rng.choice([player for player in alive if player != voter])
+            self.votes[voter] = target
+            self.tally[target] += 1
+        self.pending = 0
+
+        mostCommon = self.tally.most_common()
+        tie = len(mostCommon) > 1 and mostCommon[0][1] == mostCommon[1][1]
+        if tie:
+            # 票が入った順に左右されないよう ID 順に並べてから選ぶ
+            executed = self.rng.choice(
+                sorted(player for player, cnt in mostCommon if cnt == mostCommon[0][1])
+            )
+        else:
+            executed = mostCommon[0][0]
+
+        self.kill(executed)
+        endType = self.judge()
+        if endType == EndType.NOTEND:
+            self.scene = Scene.NIGHT
+        return VoteResult(
+            votes=dict(self.votes),
+            randomVoters=randomVoters,
+            executed=executed,
+            role=self.roles[executed],
+            tie=tie,
+            endType=endType,
+            deaths=[executed],
+        )
+
+    # --- 夜 ---
+
+    def startNight(self):
+        self.scene = Scene.NIGHT
+        self.werewolfTarget = None
+        self.tellerTarget = {}
+        self.knightTarget = {}
+
+    def chooseKill(self, target: int) -> bool:
+        if self.roles.get(target) == Role.WEREWOLF or not self.isAlive(target):
+            return False
+        self.werewolfTarget = target
+        return True
+
+    def chooseTeller(self, teller: int, target: int):
+        self.tellerTarget[teller] = target
+
+    def chooseGuard(self, knight: int, target: int):
+        self.knightTarget[knight] = target
+
+    def nightDone(self) -> bool:
+        """生きている人狼・占い師・騎士が全員行動を選んだか
+
+        初日は人狼が相談する時間なので、締め切りまで待つ
+        """
+        if self.days == 0:
+            return False
+        if self.werewolfTarget is None and self.countAlive(role=Role.WEREWOLF):
+            return False
+        for role, targets in (
+            (Role.TELLER, self.tellerTarget),
+            (Role.KNIGHT, self.knightTarget),
+        ):
+            for player in self.bits(self.aliveMask & self.roleMasks[role]):
+                if player not in targets:
+                    return False
+        return True
+
+    def resolveNight(self) -> NightResult:
+        # 人狼がターゲットを選択しなかった場合 (初日は誰も噛み殺せない)
+        randomKill = False
+        if self.days > 0 and self.werewolfTarget is None:
+            randomKill = True
+            self.werewolfTarget = self.rng.choice(self.alive(exclude=Role.WEREWOLF))
+
+        # 占い師の処理
+        tellings = {
+            teller: (
+                target,
+                getRoleType(self.roles[target]) == RoleType.WEREWOLF,
+            )
+            for teller, target in self.tellerTarget.items()
+            if target is not None
+        }
+
+        # 騎士の処理(騎士が守れなかった場合は殺害処理)
+        victim = self.werewolfTarget
+        guarded = False
+        deaths = []
+        if self.days > 0:
+            if victim in self.knightTarget.values():
+                guarded = True
+            else:
+                self.kill(victim)
+                deaths.append(victim)
+
+        self.werewolfTarget = None
+        self.knightTarget = {}
+        self.tellerTarget = {}
+
+        endType = self.judge()
+        if endType == EndType.NOTEND:
+            self.scene = Scene.DAY
+            self.days += 1
+        return NightResult(
+            victim=victim,
+            randomKill=randomKill,
+            guarded=guarded,
+            tellings=tellings,
+            endType=endType,
+            deaths=deaths,
+        )
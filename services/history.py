@@ -0,0 +1,276 @@
+import asyncio
+import random
+import sqlite3
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, TypeVar, Union
+
+from services.engine import (
+    EndType,
+    NightResult,
+    Role,
+    RoleType,
+    VoteResult,
+    deal,
+    getRoleType,
+)
+from services.metrics import metrics
+from services.replay import replay
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    guildId INTEGER NOT NULL,
+    lobbyId INTEGER NOT NULL,
+    startedAt REAL NOT NULL,
+    endedAt REAL NOT NULL,
+    days INTEGER NOT NULL,
+    players INTEGER NOT NULL,
+    castKey TEXT NOT NULL,
+    winner TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS participants (
+    gameId INTEGER NOT NULL,
+    player INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    won INTEGER,
+    deathDay INTEGER,
+    deathCause TEXT,
+    PRIMARY KEY (gameId, player)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS votes (
+    gameId INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    voter INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    random INTEGER NOT NULL,
+    PRIMARY KEY (gameId, day, voter)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS participantsByPlayer ON participants (player, role, won);
+CREATE INDEX IF NOT EXISTS historyByCast ON history (castKey, winner);
+"""
+
+# participants.deathCause の値
+EXECUTED = "executed"
+KILLED = "killed"
+
+# 勝った陣営 (強制終了は勝ち負けなしとして participants.won を NULL にする)
+WINNERS = {
+    EndType.WONWOLFS: RoleType.WEREWOLF,
+    EndType.WONVILAGGERS: RoleType.VILLAGER,
+    EndType.WONFOX: RoleType.OTHER,
+}
+
+# submit() された記録をまとめるために待つ時間 (秒)
+WINDOW = 1.0
+
+T = TypeVar("T")
+
+
+def castKey(cast: Dict[Role, int], players: int) -> str:
+    """人数と村人以外の役職の数から配役を表す文字列を作る (例: 15:TELLER=1,WEREWOLF=3)"""
+    counts = ",".join(
+        f"{role.value}={cast[role]}"
+        for role in Role
+        if role != Role.VILLAGER and cast.get(role)
+    )
+    return f"{players}:{counts}"
+
+
+@dataclass(slots=True)
+class GameRecord:
+    """1ゲーム分の配役・死亡・投票・勝敗"""
+
+    guildId: int
+    lobbyId: int
+    startedAt: float
+    cast: Dict[Role, int]
+    # (プレイヤーID, 役職)
+    seats: List[Tuple[int, Role]]
+    # プレイヤーID → (死んだ日, 死因)
+    deaths: Dict[int, Tuple[int, str]] = field(default_factory=dict)
+    # (日, 投票者, 投票先, ランダム投票か)
+    votes: List[Tuple[int, int, int, bool]] = field(default_factory=list)
+    days: int = 0
+    winner: EndType = EndType.FORCE
+    endedAt: float = 0
+
+    def result(self, day: int, result: Union[VoteResult, NightResult]):
+        """day 日目の投票・夜の結果を記録する"""
+        self.days = day
+        if isinstance(result, VoteResult):
+            randomVoters = set(result.randomVoters)
+            self.votes.extend(
+                (day, voter, target, voter in randomVoters)
+                for voter, target in result.votes.items()
+            )
+            cause = EXECUTED
+        else:
+            cause = KILLED
+        for player in result.deaths:
+            self.deaths[player] = (day, cause)
+
+    def end(self, winner: EndType):
+        self.winner = winner
+        self.endedAt = time.time()
+
+
+def recordFromLog(
+    events: Iterable[dict], guildId: int, lobbyId: int
+) -> Optional[GameRecord]:
+    """リプレイログから途中までの GameRecord を作り直す (再起動からの再開用)"""
+    events = list(events)
+    if not events or events[0]["e"] != "start":
+        return None
+    start = events[0]
+    cast = {Role(role): count for role, count in start["cast"].items()}
+    record = GameRecord(
+        guildId,
+        lobbyId,
+        start.get("at", 0),
+        cast,
+        deal(start["players"], cast, random.Random(start["seed"])),
+    )
+    replay(events, record.result)
+    return record
+
+
+@dataclass(slots=True)
+class RoleStats:
+    role: Role
+    games: int
+    wins: int
+
+
+class HistoryStore:
+    """終わったゲームを SQLite に記録し、/stats の集計をする
+
+    記録は WINDOW 秒ためてから専用のスレッドで1トランザクションで書くので、
+    ゲームの進行がディスクへの書き込みを待つことはない
+    """
+
+    def __init__(self, path: str = "werewolf.db", window: float = WINDOW):
+        self.window = window
+        self.pending: List[GameRecord] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.tasks: Set[asyncio.Task] = set()
+        # SQLite の接続はこのスレッドだけで使う
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="history")
+        self.db: sqlite3.Connection = self.executor.submit(self.connect, path).result()
+
+    @staticmethod
+    def connect(path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(path, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        return db
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, func, *args
+        )
+
+    def submit(self, record: GameRecord):
+        """記録を書く予約をする (window 秒のうちに届いた分はまとめて書く)"""
+        self.pending.append(record)
+        if self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(
+                self.window, self.flushLater
+            )
+
+    def flushLater(self):
+        self.timer = None
+        task = asyncio.create_task(self.flush())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        records, self.pending = self.pending, []
+        if not records:
+            return
+        try:
+            with metrics.time("history_write_seconds"):
+                await self.run(self.write, records)
+        except Exception:
+            traceback.print_exc()
+            return
+        metrics.inc("history_games_total", len(records))
+
+    def write(self, records: List[GameRecord]):
+        with self.db:
+            for record in records:
+                winner = WINNERS.get(record.winner)
+                gameId = self.db.execute(
+                    "INSERT INTO history"
+                    " (guildId, lobbyId, startedAt, endedAt, days, players, castKey, winner)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        record.guildId,
+                        record.lobbyId,
+                        record.startedAt,
+                        record.endedAt,
+                        record.days,
+                        len(record.seats),
+                        castKey(record.cast, len(record.seats)),
+                        record.winner.value,
+                    ),
+                ).lastrowid
+                self.db.executemany(
+                    "INSERT INTO participants VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            gameId,
+                            player,
+                            role.value,
+                            None if winner is None else getRoleType(role) == winner,
+                            *record.deaths.get(player, (None, None)),
+                        )
+                        for player, role in record.seats
+                    ],
+                )
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO votes VALUES (?, ?, ?, ?, ?)",
+                    [(gameId, *vote) for vote in record.votes],
+                )
+
+    async def playerStats(self, player: int) -> List[RoleStats]:
+        """役職ごとの勝敗 (強制終了したゲームは数えない)"""
+        return await self.run(self.queryPlayer, player)
+
+    def queryPlayer(self, player: int) -> List[RoleStats]:
+        return [
+            RoleStats(Role(role), games, wins)
+            for role, games, wins in self.db.execute(
+                "SELECT role, COUNT(won), COALESCE(SUM(won), 0) FROM participants"
+                " WHERE player = ? GROUP BY role",
+                (player,),
+            )
+            if games
+        ]
+
+    async def castStats(
+        self, cast: Dict[Role, int], players: int
+    ) -> Dict[EndType, int]:
+        """同じ配役のゲームで、どの陣営が何回勝ったか"""
+        return await self.run(self.queryCast, castKey(cast, players))
+
+    def queryCast(self, key: str) -> Dict[EndType, int]:
+        return {
+            EndType(winner): count
+            for winner, count in self.db.execute(
+                "SELECT winner, COUNT(*) FROM history"
+                " WHERE castKey = ? AND winner != ? GROUP BY winner",
+                (key, EndType.FORCE.value),
+            )
+        }
+
+    async def close(self):
+        await self.flush()
+        await self.run(self.db.close)
+        self.executor.shutdown()
@@ -0,0 +1,51 @@
+import os
+import resource
+from typing import Any, Dict, Sequence
+
+import discord
+
+
+def cacheOptions(mode: str = "voice") -> Dict[str, Any]:
+    """commands.Bot に渡すメンバーキャッシュの設定
+
+    voice: ボイスチャンネルにいるメンバーだけをキャッシュし、起動時のチャンクもしない
+           (ロビー・ゲーム用チャンネルはボイスチャンネルで、参加者は GameSession が持つ)
+    all:   members インテントを有効にして全メンバーをキャッシュする
+    """
+    intents = discord.Intents.default()
+    match mode:
+        case "voice":
+            return {
+                "intents": intents,
+                "member_cache_flags": discord.MemberCacheFlags(
+                    voice=True, joined=False
+                ),
+                "chunk_guilds_at_startup": False,
+            }
+        case "all":
+            intents.members = True
+            return {
+                "intents": intents,
+                "member_cache_flags": discord.MemberCacheFlags.all(),
+                "chunk_guilds_at_startup": True,
+            }
+    raise ValueError(f"unknown memberCache mode: {mode}")
+
+
+def residentBytes() -> int:
+    """現在の常駐メモリ (Linux 以外ではピーク値)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def memoryReport(guilds: Sequence[discord.Guild]) -> str:
+    rss = residentBytes() / 2**20
+    members = sum(len(guild.members) for guild in guilds)
+    perGuild = rss / len(guilds) if guilds else rss
+    return (
+        f"memory: {rss:.1f}MiB resident, {len(guilds)} guilds"
+        f" ({perGuild:.1f}MiB/guild), {members} cached members"
+    )
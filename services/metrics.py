@@ -0,0 +1,157 @@
+import asyncio
+import bisect
+import contextvars
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import aiohttp
+
+# REST 呼び出しを数えるときのフェーズ (ゲームごとのタスクで設定する)
+currentPhase: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "currentPhase", default="idle"
+)
+
+# 秒単位のヒストグラムの区切り
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# URL 中の ID をまとめてルートごとに数える
+_SNOWFLAKE = re.compile(r"/\d{15,}")
+_TOKEN = re.compile(r"(/interactions/\{id\}|/webhooks/\{id\})/[^/]+")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def routeOf(method: str, path: str) -> str:
+    path = _SNOWFLAKE.sub("/{id}", path)
+    path = _TOKEN.sub(r"\1/{token}", path)
+    return f"{method} {path}"
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    """REST 呼び出し・処理時間・ゲーム数を集計して Prometheus のテキスト形式で出す"""
+
+    def __init__(self):
+        self.counters: Counter = Counter()
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.gauges: Dict[str, Callable[[], float]] = {}
+
+    def inc(self, name: str, value: int = 1, **labels: str):
+        self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, name: str, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def gauge(self, name: str, read: Callable[[], float]):
+        self.gauges[name] = read
+
+    def traceConfig(self) -> aiohttp.TraceConfig:
+        """discord.py の HTTP クライアントに渡して REST 呼び出しを数える"""
+        trace = aiohttp.TraceConfig()
+
+        async def onStart(session, context, params):
+            context.started = time.perf_counter()
+
+        async def onEnd(session, context, params):
+            route = routeOf(params.method, params.url.path)
+            phase = currentPhase.get()
+            status = str(params.response.status)
+            self.inc("rest_requests_total", route=route, phase=phase, status=status)
+            self.observe(
+                "rest_request_seconds",
+                time.perf_counter() - context.started,
+                route=route,
+            )
+
+        async def onError(session, context, params):
+            route = routeOf(params.method, params.url.path)
+            self.inc("rest_errors_total", route=route, phase=currentPhase.get())
+
+        trace.on_request_start.append(onStart)
+        trace.on_request_end.append(onEnd)
+        trace.on_request_exception.append(onError)
+        return trace
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(
+                [*map(str, histogram.buckets), "+Inf"], histogram.counts
+            ):
+                cumulative += count
+                le = labels + (("le", bound),)
+                lines.append(f"{name}_bucket{_labels(le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.sum:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        for name, read in sorted(self.gauges.items()):
+            lines.append(f"{name} {read()}")
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9100):
+        """GET されたら render() を返すだけの HTTP サーバーを立てる"""
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                body = self.render().encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: text/plain; version=0.0.4\r\n"
+                    + f"Content-Length: {len(body)}\r\n".encode()
+                    + b"Connection: close\r\n\r\n"
+                    + body
+                )
+                await writer.drain()
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+    async def dump(
+        self, interval: float, write: Optional[Callable[[str], None]] = None
+    ):
+        """interval 秒ごとに render() をログに出す"""
+        write = write or print
+        while True:
+            await asyncio.sleep(interval)
+            write(self.render())
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+metrics = Metrics()
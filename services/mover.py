@@ -0,0 +1,38 @@
+import asyncio
+from typing import Iterable, List, Optional, Tuple
+
+import discord
+
+from services.metrics import metrics
+from services.provision import ROUTE_LIMIT, withRetry
+
+
+async def moveAll(
+    moves: Iterable[Tuple[discord.Member, Optional[discord.VoiceChannel]]],
+    limit: int = ROUTE_LIMIT,
+) -> List[Tuple[discord.Member, BaseException]]:
+    """メンバーをまとめて移動し、失敗したメンバーと例外の組を返す
+
+    ボイスチャンネルにいないメンバーと、すでに移動先にいるメンバーは飛ばす
+    """
+    semaphore = asyncio.Semaphore(limit)
+    failures: List[Tuple[discord.Member, BaseException]] = []
+
+    async def move(member: discord.Member, channel: Optional[discord.VoiceChannel]):
+        if member.voice is None or member.voice.channel == channel:
+            return
+        async with semaphore:
+            try:
+                with metrics.time("move_seconds"):
+                    await withRetry(lambda: member.move_to(channel))
+            except Exception as e:
+                failures.append((member, e))
+
+    await asyncio.gather(*[move(member, channel) for member, channel in moves])
+    return failures
+
+
+def failureReport(failures: List[Tuple[discord.Member, BaseException]]) -> str:
+    return "移動に失敗したメンバーがいます:\n" + "\n".join(
+        [f"- {member.mention}: {e}" for member, e in failures]
+    )
@@ -0,0 +1,64 @@
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import discord
+
+from services.engine import Role
+
+if TYPE_CHECKING:
+    from services.werewolf import GameSession
+
+# 1つのセレクトメニューに入れられる選択肢の数と、1つのメッセージに置けるメニューの数
+OPTION_LIMIT = 25
+SELECT_LIMIT = 5
+
+Pages = List[List[discord.SelectOption]]
+
+
+def paginate(options: List[discord.SelectOption]) -> Pages:
+    """OPTION_LIMIT 件ずつに分ける (SELECT_LIMIT ページを超える分は入らない)"""
+    return [
+        options[start : start + OPTION_LIMIT]
+        for start in range(0, len(options), OPTION_LIMIT)
+    ][:SELECT_LIMIT]
+
+
+class OptionCache:
+    """生存者から作る SelectOption を (用途, 見る人) ごとに持ち、誰かが死ぬまで使い回す"""
+
+    def __init__(self, session: "GameSession"):
+        self.session = session
+        self.aliveMask = -1
+        self.bases: Dict[Tuple[str, Optional[Role]], List[discord.SelectOption]] = {}
+        self.pagesFor: Dict[Tuple[str, Optional[Role], Optional[int]], Pages] = {}
+
+    def pages(
+        self,
+        description: str,
+        viewer: Optional[int] = None,
+        exclude: Optional[Role] = None,
+    ) -> Pages:
+        """description を説明にした生存者の選択肢 (viewer 自身と exclude の役職は除く)"""
+        # 生存者が変わったときだけ作り直す
+        if self.session.engine.aliveMask != self.aliveMask:
+            self.aliveMask = self.session.engine.aliveMask
+            self.bases.clear()
+            self.pagesFor.clear()
+
+        key = (description, exclude, viewer)
+        pages = self.pagesFor.get(key)
+        if pages is None:
+            base = self.bases.get((description, exclude))
+            if base is None:
+                base = self.bases[(description, exclude)] = [
+                    discord.SelectOption(
+                        label=member.member.display_name,
+                        value=str(member.member.id),
+                        description=description,
+                    )
+                    for member in self.session.aliveMembers(exclude)
+                ]
+            if viewer is not None:
+                viewerId = str(viewer)
+                base = [option for option in base if option.value != viewerId]
+            pages = self.pagesFor[key] = paginate(base)
+        return pages
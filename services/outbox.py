@@ -0,0 +1,145 @@
+import asyncio
+import traceback
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import discord
+
+from services.metrics import metrics
+from services.provision import ROUTE_LIMIT, gatherBounded, withRetry
+
+# Discord のメッセージの最大文字数
+MESSAGE_LIMIT = 2000
+# post() されたテキストをまとめるために待つ時間 (秒)
+WINDOW = 0.2
+
+
+@dataclass(slots=True)
+class Outgoing:
+    content: str
+    kwargs: Dict[str, Any]
+    # send() で送るメッセージ (まとめずに送り、送ったメッセージを入れる)
+    future: Optional[asyncio.Future] = None
+
+
+def pack(contents: List[str], limit: int = MESSAGE_LIMIT) -> List[str]:
+    """テキストを改行でつなぎ、limit 文字を超えないように分けて返す"""
+    chunks: List[str] = []
+    current = ""
+    for content in contents:
+        # 1つで limit を超えるものは行ごと (それでも長ければ limit ごと) に切る
+        pieces = [content]
+        if len(content) > limit:
+            pieces = []
+            for line in content.split("\n"):
+                pieces.extend(
+                    line[start : start + limit]
+                    for start in range(0, max(len(line), 1), limit)
+                )
+        for piece in pieces:
+            if current and len(current) + 1 + len(piece) > limit:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class Outbox:
+    """チャンネルごとに送るメッセージをため、続けて送るテキストは1通にまとめる
+
+    チャンネル内の順番は守り、別々のチャンネルへは並列に送る
+    """
+
+    def __init__(self, window: float = WINDOW, limit: int = ROUTE_LIMIT):
+        self.window = window
+        self.limit = limit
+        self.pending: Dict[int, Tuple[discord.abc.Messageable, List[Outgoing]]] = {}
+        self.locks: Dict[int, asyncio.Lock] = {}
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.tasks: Set[asyncio.Task] = set()
+
+    def post(self, channel: discord.abc.Messageable, content: str):
+        """テキストを送る予約をする (window 秒のうちに届いた分はまとめて送る)"""
+        self.enqueue(channel, Outgoing(content, {}))
+        if self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(
+                self.window, self.flushLater
+            )
+
+    async def send(
+        self, channel: discord.abc.Messageable, content: str, **kwargs
+    ) -> discord.Message:
+        """ためてあるテキストの後ろにすぐ送り、送ったメッセージを返す"""
+        item = Outgoing(content, kwargs, asyncio.get_running_loop().create_future())
+        self.enqueue(channel, item)
+        await self.flushChannel(channel.id)
+        return await item.future
+
+    def enqueue(self, channel: discord.abc.Messageable, item: Outgoing):
+        self.pending.setdefault(channel.id, (channel, []))[1].append(item)
+
+    def flushLater(self):
+        self.timer = None
+        task = asyncio.create_task(self.flush())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def flush(self, channel: Optional[discord.abc.Messageable] = None):
+        """ためてあるメッセージを送る (channel を渡すとそのチャンネルだけ)"""
+        if channel is not None:
+            return await self.flushChannel(channel.id)
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        await gatherBounded(
+            [self.flushChannel(channelId) for channelId in list(self.pending)],
+            self.limit,
+        )
+
+    async def flushChannel(self, channelId: int):
+        # post() の失敗はログに出すだけにし、send() の失敗は呼び出し元に返す
+        lock = self.locks.setdefault(channelId, asyncio.Lock())
+        async with lock:
+            channel, items = self.pending.pop(channelId, (None, []))
+            texts: List[str] = []
+            for item in items:
+                if item.future is None:
+                    texts.append(item.content)
+                    continue
+                # ここまでのテキストは先に送る
+                await self.deliverTexts(channel, texts)
+                texts = []
+                try:
+                    message = await self.deliver(channel, [item.content], item.kwargs)
+                except Exception as e:
+                    item.future.set_exception(e)
+                else:
+                    item.future.set_result(message)
+            await self.deliverTexts(channel, texts)
+
+    async def deliverTexts(self, channel: discord.abc.Messageable, texts: List[str]):
+        try:
+            await self.deliver(channel, texts)
+        except Exception:
+            traceback.print_exc()
+
+    async def deliver(
+        self,
+        channel: discord.abc.Messageable,
+        contents: List[str],
+        kwargs: Optional[Dict[str, Any]] = None,
+    ) -> Optional[discord.Message]:
+        message = None
+        if not contents:
+            return message
+        chunks = pack(contents)
+        metrics.inc("outbox_posts_total", len(contents))
+        for i, chunk in enumerate(chunks):
+            # view などは最後の1通に付ける
+            extra = kwargs if kwargs and i == len(chunks) - 1 else {}
+            metrics.inc("outbox_messages_total")
+            message = await withRetry(lambda: channel.send(chunk, **extra))
+        return message
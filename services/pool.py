@@ -0,0 +1,165 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import discord
+
+from services.metrics import metrics
+from services.provision import (
+    ROUTE_LIMIT,
+    Provisioner,
+    ProvisionError,
+    gatherBounded,
+    withRetry,
+)
+
+WEREWOLF_NAME = "人狼"
+GHOST_NAME = "霊界"
+# 個人チャンネルは名前を変えずに使い回す (チャンネル名の変更は 10 分に 2 回までしかできない)
+SEAT_PREFIX = "席"
+
+Overwrites = Dict[object, discord.PermissionOverwrite]
+
+
+class ChannelPool:
+    """category 配下のゲーム用チャンネルをゲームをまたいで使い回す
+
+    同じカテゴリを複数のロビーで使えるよう、チャンネル名の末尾にロビーのIDを付けて見分ける
+    """
+
+    def __init__(self, category: discord.CategoryChannel, lobbyId: int):
+        self.category = category
+        self.lobbyId = lobbyId
+        self.werewolf: Optional[discord.VoiceChannel] = None
+        self.ghost: Optional[discord.TextChannel] = None
+        self.seats: List[discord.VoiceChannel] = []
+        # 裏で走っている release() (次の acquire() はこれが終わるのを待つ)
+        self.releasing: Optional[asyncio.Task] = None
+        self.adopt()
+
+    def adopt(self):
+        """再起動前に作ったチャンネルを拾い直す"""
+        suffix = self.name("")
+        for channel in self.category.channels:
+            # ほかのロビーのチャンネルは拾わない
+            if not channel.name.endswith(suffix):
+                continue
+            if isinstance(channel, discord.TextChannel):
+                if channel.name == self.name(GHOST_NAME) and self.ghost is None:
+                    self.ghost = channel
+            elif isinstance(channel, discord.VoiceChannel):
+                if channel.name == self.name(WEREWOLF_NAME) and self.werewolf is None:
+                    self.werewolf = channel
+                elif channel.name.startswith(SEAT_PREFIX):
+                    self.seats.append(channel)
+        self.seats.sort(key=lambda channel: channel.position)
+
+    def name(self, base: str) -> str:
+        return f"{base}-{self.lobbyId}"
+
+    def channels(self) -> List[discord.abc.GuildChannel]:
+        return [c for c in (self.werewolf, self.ghost) if c is not None] + self.seats
+
+    def forget(self, channel: discord.abc.GuildChannel):
+        """消されたチャンネルをプールから外す"""
+        if channel is self.werewolf:
+            self.werewolf = None
+        elif channel is self.ghost:
+            self.ghost = None
+        elif channel in self.seats:
+            self.seats.remove(channel)
+
+    def hidden(self) -> Overwrites:
+        return {
+            self.category.guild.default_role: discord.PermissionOverwrite(
+                view_channel=False
+            ),
+        }
+
+    async def acquire(
+        self,
+        werewolfOverwrites: Overwrites,
+        ghostOverwrites: Overwrites,
+        seatOverwrites: List[Overwrites],
+    ) -> Tuple[discord.VoiceChannel, discord.TextChannel, List[discord.VoiceChannel]]:
+        """足りないチャンネルだけを作り、既存のチャンネルは権限だけを書き換えて返す"""
+        if self.releasing is not None:
+            await self.releasing
+            self.releasing = None
+        provisioner = Provisioner(self.category)
+
+        async def prepare(
+            channel: Optional[discord.abc.GuildChannel],
+            create: Callable[[Overwrites], Awaitable[discord.abc.GuildChannel]],
+            overwrites: Overwrites,
+        ):
+            if channel is not None:
+                try:
+                    await withRetry(lambda: channel.edit(overwrites=overwrites))
+                    return channel
+                except discord.NotFound:
+                    # 手で消されたチャンネルは作り直す
+                    self.forget(channel)
+            return await create(overwrites)
+
+        count = len(seatOverwrites)
+        seats = self.seats[:count] + [None] * (count - len(self.seats))
+        try:
+            werewolf, ghost, *seats = await provisioner.run(
+                [
+                    prepare(
+                        self.werewolf,
+                        lambda o: provisioner.voice(self.name(WEREWOLF_NAME), o),
+                        werewolfOverwrites,
+                    ),
+                    prepare(
+                        self.ghost,
+                        lambda o: provisioner.text(self.name(GHOST_NAME), o),
+                        ghostOverwrites,
+                    ),
+                    *[
+                        prepare(
+                            seat,
+                            lambda o, i=i: provisioner.voice(
+                                self.name(f"{SEAT_PREFIX}{i + 1}"), o
+                            ),
+                            overwrites,
+                        )
+                        for i, (seat, overwrites) in enumerate(
+                            zip(seats, seatOverwrites)
+                        )
+                    ],
+                ]
+            )
+        except ProvisionError:
+            # 作ったチャンネルは Provisioner が消すので、使い回した分だけ元に戻す
+            await self.release()
+            raise
+
+        self.werewolf = werewolf
+        self.ghost = ghost
+        # 作り直した席も含めて、今回使った席を先頭に並べる
+        self.seats = seats + [seat for seat in self.seats if seat not in seats]
+        return werewolf, ghost, seats
+
+    async def release(
+        self,
+        channels: Optional[List[discord.abc.GuildChannel]] = None,
+        limit: int = ROUTE_LIMIT,
+    ):
+        """チャンネルを非公開に戻し、メッセージを消して次のゲームに備える"""
+
+        async def reset(channel: discord.abc.GuildChannel):
+            with metrics.time("channel_reset_seconds"):
+                await withRetry(lambda: channel.edit(overwrites=self.hidden()))
+                await withRetry(lambda: channel.purge(limit=None))
+
+        if channels is None:
+            channels = self.channels()
+        await gatherBounded([reset(channel) for channel in channels], limit)
+
+    def releaseInBackground(
+        self, channels: Optional[List[discord.abc.GuildChannel]] = None
+    ) -> asyncio.Task:
+        """release() を待たずに返す"""
+        self.releasing = asyncio.create_task(self.release(channels))
+        return self.releasing
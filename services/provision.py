@@ -0,0 +1,105 @@
+import asyncio
+import traceback
+from typing import Awaitable, Callable, Dict, Iterable, List, TypeVar, Union
+
+import discord
+
+from services.metrics import metrics
+
+T = TypeVar("T")
+
+# 同じルート (チャンネル作成・メンバー編集など) に同時に投げるリクエスト数の上限
+ROUTE_LIMIT = 5
+# 一時的なエラー (5xx・タイムアウト・レート制限) の再試行回数
+RETRIES = 3
+
+
+async def withRetry(factory: Callable[[], Awaitable[T]], retries: int = RETRIES) -> T:
+    """一時的なエラーなら待ってから factory() をやり直す
+
+    レート制限のバケットは discord.py がレスポンスヘッダーを見て待つので、
+    ここでは 429 が例外として返ってきたときの retry_after だけを見る
+    """
+    for attempt in range(retries):
+        last = attempt == retries - 1
+        try:
+            return await factory()
+        except discord.RateLimited as e:
+            if last:
+                raise
+            await asyncio.sleep(e.retry_after)
+        except discord.HTTPException as e:
+            if last or e.status < 500:
+                raise
+            await asyncio.sleep(0.5 * 2**attempt)
+        except (asyncio.TimeoutError, OSError):
+            if last:
+                raise
+            await asyncio.sleep(0.5 * 2**attempt)
+
+
+async def gatherBounded(
+    coros: Iterable[Awaitable[T]], limit: int = ROUTE_LIMIT
+) -> List[Union[T, BaseException]]:
+    """同時実行数を limit までに抑えて coros を実行する (例外は結果として返す)"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coro: Awaitable[T]) -> T:
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*[run(coro) for coro in coros], return_exceptions=True)
+
+
+class ProvisionError(Exception):
+    def __init__(self, errors: List[BaseException]):
+        self.errors = errors
+        super().__init__(", ".join(str(e) for e in errors))
+
+
+class Provisioner:
+    """ゲーム用チャンネルを並列に作成し、失敗したら作成済みのものを消す"""
+
+    def __init__(self, category: discord.CategoryChannel, limit: int = ROUTE_LIMIT):
+        self.category = category
+        self.limit = limit
+        self.created: List[discord.abc.GuildChannel] = []
+
+    async def voice(
+        self, name: str, overwrites: Dict[object, discord.PermissionOverwrite]
+    ) -> discord.VoiceChannel:
+        with metrics.time("channel_create_seconds"):
+            channel = await self.category.create_voice_channel(
+                name=name, overwrites=overwrites
+            )
+        self.created.append(channel)
+        return channel
+
+    async def text(
+        self, name: str, overwrites: Dict[object, discord.PermissionOverwrite]
+    ) -> discord.TextChannel:
+        with metrics.time("channel_create_seconds"):
+            channel = await self.category.create_text_channel(
+                name=name, overwrites=overwrites
+            )
+        self.created.append(channel)
+        return channel
+
+    async def run(self, coros: Iterable[Awaitable[T]]) -> List[T]:
+        """coros をまとめて実行し、1つでも失敗したらロールバックして ProvisionError を投げる"""
+        results = await gatherBounded(coros, self.limit)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            for error in errors:
+                traceback.print_exception(error)
+            await self.rollback()
+            raise ProvisionError(errors)
+        return results
+
+    async def rollback(self):
+        async def delete(channel: discord.abc.GuildChannel):
+            with metrics.time("channel_delete_seconds"):
+                await channel.delete()
+
+        await gatherBounded([delete(channel) for channel in self.created], self.limit)
+        self.created = []
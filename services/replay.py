@@ -0,0 +1,151 @@
+"""ゲームの出来事を JSONL に書き出し、あとから Engine で再実行して結果を確かめる
+
+python -m services.replay replays/*.jsonl
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from services.engine import Engine, EndType, NightResult, Role, Scene, VoteResult, deal
+from services.snapshot import act
+
+
+class GameLog:
+    """1ゲーム分の出来事を1行1イベントで追記する
+
+    乱数は開始時 (と再起動からの再開時) のシードだけを書き、
+    配役・ランダム投票・同数の決選・ランダム襲撃はシードから再現する
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # 1行ごとに書き出す (途中で落ちてもそこまでは残る)
+        self.file = open(path, "a", buffering=1, encoding="utf-8")
+
+    def write(self, event: str, **fields):
+        self.file.write(
+            json.dumps({"e": event, **fields}, separators=(",", ":")) + "\n"
+        )
+
+    def start(self, seed: int, players: List[int], cast: Dict[Role, int]):
+        self.write(
+            "start",
+            at=time.time(),
+            seed=seed,
+            players=players,
+            cast={role.value: count for role, count in cast.items()},
+        )
+
+    def resume(self, seed: int):
+        self.write("resume", seed=seed)
+
+    def phase(self, scene: Scene):
+        self.write("phase", scene=scene.value)
+
+    def action(self, kind: str, actor: int, target: int):
+        self.write(kind, actor=actor, target=target)
+
+    def result(self, result: Union[VoteResult, NightResult]):
+        self.write(
+            "result",
+            scene=(
+                Scene.EVENING if isinstance(result, VoteResult) else Scene.NIGHT
+            ).value,
+            deaths=result.deaths,
+            end=result.endType.value,
+        )
+
+    def end(self, endType: EndType):
+        self.write("end", end=endType.value)
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+
+def readLog(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def replay(
+    events: Iterable[dict],
+    onResult: Optional[Callable[[int, Union[VoteResult, NightResult]], None]] = None,
+) -> List[str]:
+    """ログを Engine で再実行し、記録された結果と食い違った箇所を返す
+
+    onResult を渡すと、投票・夜の結果ごとに (その日, 結果) で呼ぶ
+    """
+    engine: Optional[Engine] = None
+    mismatches: List[str] = []
+    for n, event in enumerate(events, 1):
+        match event["e"]:
+            case "start":
+                rng = random.Random(event["seed"])
+                cast = {Role(role): count for role, count in event["cast"].items()}
+                engine = Engine(deal(event["players"], cast, rng), rng)
+            case "resume":
+                engine.rng = random.Random(event["seed"])
+            case "phase":
+                match Scene(event["scene"]):
+                    case Scene.DAY:
+                        engine.startDay()
+                    case Scene.EVENING:
+                        engine.startEvening()
+                    case Scene.NIGHT:
+                        engine.startNight()
+            case "result":
+                day = engine.days
+                if Scene(event["scene"]) == Scene.EVENING:
+                    result = engine.resolveVotes()
+                else:
+                    result = engine.resolveNight()
+                actual = {"deaths": result.deaths, "end": result.endType.value}
+                expected = {"deaths": event["deaths"], "end": event["end"]}
+                if actual != expected:
+                    mismatches.append(f"line {n}: expected {expected}, got {actual}")
+                if onResult is not None:
+                    onResult(day, result)
+            case "end":
+                pass
+            case kind:
+                act(engine, kind, event["actor"], event["target"])
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("logs", nargs="+")
+    args = parser.parse_args()
+
+    failed = 0
+    events = 0
+    started = time.perf_counter()
+    for path in args.logs:
+        log = list(readLog(path))
+        events += len(log)
+        mismatches = replay(log)
+        if mismatches:
+            failed += 1
+            print(f"{path}: NG")
+            for mismatch in mismatches:
+                print(f"  {mismatch}")
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{len(args.logs) - failed}/{len(args.logs)} games reproduced"
+        f" ({events} events in {elapsed:.3f}s)"
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
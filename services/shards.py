@@ -0,0 +1,113 @@
+"""シャードを複数のプロセスに分けて Bot を起動する
+
+python -m services.shards --shards 4 --processes 2
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from typing import List
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS owners (
+    guildId INTEGER NOT NULL,
+    lobbyId INTEGER NOT NULL,
+    owner TEXT NOT NULL,
+    heartbeat REAL NOT NULL,
+    PRIMARY KEY (guildId, lobbyId)
+);
+"""
+
+# この秒数 heartbeat が更新されなければ、担当していたプロセスは落ちたとみなす
+OWNER_TTL = 90
+
+
+def shardOf(guildId: int, shardCount: int) -> int:
+    """Discord と同じ計算でギルドの担当シャードを決める"""
+    return (guildId >> 22) % shardCount
+
+
+def assign(shardCount: int, processes: int) -> List[List[int]]:
+    """シャードをプロセスに順番に割り振る"""
+    return [list(range(i, shardCount, processes)) for i in range(processes)]
+
+
+def ownerName() -> str:
+    """再起動しても変わらない担当者名 (workerName か、受け持つシャードから決める)
+
+    再起動したプロセスは OWNER_TTL を待たずに自分のロビーを取り戻せる
+    """
+    return os.getenv("workerName") or (
+        f"{socket.gethostname()}:shards={os.getenv('shardIds') or 'all'}"
+    )
+
+
+class ShardRegistry:
+    """どのプロセスがどのロビーを担当しているかをプロセス間で共有する
+
+    ゲームの途中経過 (SnapshotStore) と同じ SQLite ファイルを WAL モードで使う
+    """
+
+    def __init__(self, path: str = "werewolf.db", owner: str = None):
+        self.owner = owner or ownerName()
+        self.db = sqlite3.connect(path, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def claim(self, guildId: int, lobbyId: int) -> bool:
+        """ロビーを担当する。ほかの生きているプロセスが担当中なら False を返す"""
+        now = time.time()
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO owners VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (guildId, lobbyId) DO UPDATE"
+                " SET owner = excluded.owner, heartbeat = excluded.heartbeat"
+                " WHERE owners.owner = excluded.owner OR owners.heartbeat < ?",
+                (guildId, lobbyId, self.owner, now, now - OWNER_TTL),
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self):
+        with self.db:
+            self.db.execute(
+                "UPDATE owners SET heartbeat = ? WHERE owner = ?",
+                (time.time(), self.owner),
+            )
+
+    def release(self):
+        with self.db:
+            self.db.execute("DELETE FROM owners WHERE owner = ?", (self.owner,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, default=os.cpu_count())
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    workers = []
+    for shardIds in assign(args.shards, min(args.processes, args.shards)):
+        env = dict(
+            os.environ,
+            shardCount=str(args.shards),
+            shardIds=",".join(map(str, shardIds)),
+        )
+        workers.append(subprocess.Popen([sys.executable, "main.py"], env=env))
+
+    def stop(signum, frame):
+        for worker in workers:
+            worker.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    sys.exit(max(worker.wait() for worker in workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Engine を使って全員ランダムに行動するゲームを大量に回す
+
+python -m services.simulator 15 --werewolf 3 --teller 1 --knight 1 --games 1000000
+"""
+
+import argparse
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from services.engine import Engine, EndType, Role, deal
+
+# 1つのプロセスにまとめて渡すゲーム数
+CHUNK = 10000
+
+
+def playRandom(engine: Engine) -> EndType:
+    """全員がランダムに行動したときの結果を返す
+
+    人狼の襲撃先と投票は選ばなかった場合の Engine のランダム処理に任せる
+    """
+    rng = engine.rng
+    while True:
+        engine.startNight()
+        alive = engine.alive()
+        for role, choose in (
+            (Role.TELLER, engine.chooseTeller),
+            (Role.KNIGHT, engine.chooseGuard),
+        ):
+            for player in engine.withRole(role):
+                if engine.isAlive(player):
+                    choose(player, rng.choice([p for p in alive if p != player]))
+        result = engine.resolveNight()
+        if result.endType != EndType.NOTEND:
+            return result.endType
+
+        engine.startEvening()
+        result = engine.resolveVotes()
+        if result.endType != EndType.NOTEND:
+            return result.endType
+
+
+def playMany(
+    players: int, cast: Dict[Role, int], games: int, seed: Optional[int] = None
+) -> Counter:
+    rng = random.Random(seed)
+    results = Counter()
+    ids = range(players)
+    for _ in range(games):
+        results[playRandom(Engine(deal(ids, cast, rng), rng))] += 1
+    return results
+
+
+def _playChunk(args: Tuple[int, Dict[Role, int], int, int]) -> Counter:
+    return playMany(*args)
+
+
+def simulate(
+    players: int,
+    cast: Dict[Role, int],
+    games: int,
+    processes: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> Counter:
+    """games 回のゲームをプロセスプールで分けて回し、EndType ごとの回数を返す"""
+    seeds = random.Random(seed)
+    chunks = [
+        (players, cast, min(CHUNK, games - start), seeds.getrandbits(64))
+        for start in range(0, games, CHUNK)
+    ]
+    results = Counter()
+    if processes == 1:
+        for chunk in chunks:
+            results += _playChunk(chunk)
+        return results
+
+    with ProcessPoolExecutor(processes) as executor:
+        for counter in executor.map(_playChunk, chunks):
+            results += counter
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("players", type=int)
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int)
+    for role in Role:
+        if role != Role.VILLAGER:
+            parser.add_argument(f"--{role.name.lower()}", type=int, default=0)
+    args = parser.parse_args()
+
+    cast = {
+        role: getattr(args, role.name.lower()) for role in Role if role != Role.VILLAGER
+    }
+    if sum(cast.values()) > args.players:
+        parser.error("役職の数が人数より多いです")
+
+    started = time.perf_counter()
+    results = simulate(args.players, cast, args.games, args.processes, args.seed)
+    elapsed = time.perf_counter() - started
+
+    for endType, count in results.most_common():
+        print(f"{endType.name:>13}: {count / args.games:.4f} ({count})")
+    print(f"{args.games} games in {elapsed:.2f}s ({args.games / elapsed:.0f} games/s)")
+
+
+if __name__ == "__main__":
+    main()
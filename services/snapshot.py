@@ -0,0 +1,238 @@
+import sqlite3
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union
+
+from services.engine import Engine, NightResult, Role, Scene, VoteResult
+
+if TYPE_CHECKING:
+    from services.werewolf import GameSession
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    guildId INTEGER NOT NULL,
+    lobbyId INTEGER NOT NULL,
+    days INTEGER NOT NULL,
+    scene TEXT NOT NULL,
+    deadline REAL NOT NULL,
+    seconds INTEGER NOT NULL,
+    werewolfChannel INTEGER NOT NULL,
+    ghostChannel INTEGER NOT NULL,
+    PRIMARY KEY (guildId, lobbyId)
+);
+CREATE TABLE IF NOT EXISTS players (
+    guildId INTEGER NOT NULL,
+    lobbyId INTEGER NOT NULL,
+    seat INTEGER NOT NULL,
+    player INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    alive INTEGER NOT NULL,
+    channel INTEGER NOT NULL,
+    PRIMARY KEY (guildId, lobbyId, player)
+);
+CREATE TABLE IF NOT EXISTS actions (
+    guildId INTEGER NOT NULL,
+    lobbyId INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    actor INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    PRIMARY KEY (guildId, lobbyId, kind, actor)
+);
+CREATE TABLE IF NOT EXISTS replays (
+    guildId INTEGER NOT NULL,
+    lobbyId INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (guildId, lobbyId)
+);
+"""
+
+# actions.kind の値 (人狼の襲撃先は actor を 0 にして1行だけ持つ)
+VOTE = "vote"
+KILL = "kill"
+TELL = "tell"
+GUARD = "guard"
+
+
+def act(engine: Engine, kind: str, actor: int, target: int):
+    """actions.kind の行動を engine に反映する"""
+    if kind == VOTE:
+        engine.vote(actor, target)
+    elif kind == KILL:
+        engine.chooseKill(target)
+    elif kind == TELL:
+        engine.chooseTeller(actor, target)
+    elif kind == GUARD:
+        engine.chooseGuard(actor, target)
+
+
+@dataclass(slots=True)
+class Seat:
+    player: int
+    role: Role
+    alive: bool
+    channel: int
+
+
+@dataclass(slots=True)
+class Snapshot:
+    days: int
+    scene: Scene
+    deadline: float
+    seconds: int
+    werewolfChannel: int
+    ghostChannel: int
+    seats: List[Seat] = field(default_factory=list)
+    # (kind, actor, target)
+    actions: List[Tuple[str, int, int]] = field(default_factory=list)
+    # 追記中のリプレイログ
+    log: Optional[str] = None
+
+    def restore(self, engine: Engine):
+        """seats と同じ順番で作った Engine に死亡・日付・フェーズ・途中の行動を戻す"""
+        for seat in self.seats:
+            if not seat.alive:
+                engine.kill(seat.player)
+        engine.days = self.days
+        match self.scene:
+            case Scene.DAY:
+                engine.startDay()
+            case Scene.EVENING:
+                engine.startEvening()
+            case Scene.NIGHT:
+                engine.startNight()
+        for kind, actor, target in self.actions:
+            act(engine, kind, actor, target)
+
+
+class SnapshotStore:
+    """進行中のゲームを SQLite に書き残し、再起動後に読み戻す
+
+    ゲーム開始時に全体を書き、その後は変わった行だけを書く
+    """
+
+    def __init__(self, path: str = "werewolf.db"):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def key(self, session: "GameSession") -> Tuple[int, int]:
+        return (session.guildId, session.lobbyId)
+
+    def saveGame(self, session: "GameSession"):
+        key = self.key(session)
+        with self.db:
+            self.clear(key)
+            self.db.execute(
+                "INSERT INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    *key,
+                    session.days,
+                    session.scene.value,
+                    session.deadline,
+                    session.seconds,
+                    session.werewolfChannel.id,
+                    session.ghostChannel.id,
+                ),
+            )
+            self.db.executemany(
+                "INSERT INTO players VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        *key,
+                        seat,
+                        member.member.id,
+                        member.role.value,
+                        session.isAlive(member.member),
+                        session.privateChannels[member.member.id].id,
+                    )
+                    for seat, member in enumerate(session.members)
+                ],
+            )
+            if session.log is not None:
+                self.db.execute(
+                    "INSERT INTO replays VALUES (?, ?, ?)", (*key, session.log.path)
+                )
+
+    def savePhase(self, session: "GameSession"):
+        with self.db:
+            self.db.execute(
+                "UPDATE games SET days = ?, scene = ?, deadline = ?, seconds = ?"
+                " WHERE guildId = ? AND lobbyId = ?",
+                (
+                    session.days,
+                    session.scene.value,
+                    session.deadline,
+                    session.seconds,
+                    *self.key(session),
+                ),
+            )
+
+    def saveAction(self, session: "GameSession", kind: str, actor: int, target: int):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO actions VALUES (?, ?, ?, ?, ?)",
+                (*self.key(session), kind, actor, target),
+            )
+
+    def saveResult(
+        self, session: "GameSession", result: Union[VoteResult, NightResult]
+    ):
+        """投票・夜の結果の死亡を書き、行動を消す
+
+        次のフェーズの締め切りはまだ決まっていないので deadline は 0 にしておく
+        (savePhase() の前に再起動したら、再開するときに新しく締め切りを決める)
+        """
+        key = self.key(session)
+        with self.db:
+            self.db.executemany(
+                "UPDATE players SET alive = 0"
+                " WHERE guildId = ? AND lobbyId = ? AND player = ?",
+                [(*key, player) for player in result.deaths],
+            )
+            self.db.execute(
+                "UPDATE games SET days = ?, scene = ?, deadline = 0"
+                " WHERE guildId = ? AND lobbyId = ?",
+                (session.days, session.scene.value, *key),
+            )
+            self.db.execute(
+                "DELETE FROM actions WHERE guildId = ? AND lobbyId = ?", key
+            )
+
+    def delete(self, session: "GameSession"):
+        with self.db:
+            self.clear(self.key(session))
+
+    def clear(self, key: Tuple[int, int]):
+        for table in ("games", "players", "actions", "replays"):
+            self.db.execute(
+                f"DELETE FROM {table} WHERE guildId = ? AND lobbyId = ?", key
+            )
+
+    def load(self, guildId: int, lobbyId: int) -> Optional[Snapshot]:
+        key = (guildId, lobbyId)
+        row = self.db.execute(
+            "SELECT days, scene, deadline, seconds, werewolfChannel, ghostChannel"
+            " FROM games WHERE guildId = ? AND lobbyId = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            return None
+        days, scene, *rest = row
+        snapshot = Snapshot(days, Scene(scene), *rest)
+        snapshot.seats = [
+            Seat(player, Role(role), bool(alive), channel)
+            for player, role, alive, channel in self.db.execute(
+                "SELECT player, role, alive, channel FROM players"
+                " WHERE guildId = ? AND lobbyId = ? ORDER BY seat",
+                key,
+            )
+        ]
+        snapshot.actions = self.db.execute(
+            "SELECT kind, actor, target FROM actions WHERE guildId = ? AND lobbyId = ?",
+            key,
+        ).fetchall()
+        row = self.db.execute(
+            "SELECT path FROM replays WHERE guildId = ? AND lobbyId = ?", key
+        ).fetchone()
+        snapshot.log = row[0] if row else None
+        return snapshot
@@ -0,0 +1,41 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+from discord import app_commands
+
+
+def treeHash(tree: app_commands.CommandTree, applicationId: Optional[int]) -> str:
+    """登録されたグローバルコマンドの定義から、並び順に左右されないハッシュを作る"""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands()),
+        key=lambda command: (command.get("type", 1), command["name"]),
+    )
+    data = json.dumps(
+        [applicationId, payload], sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+async def syncIfChanged(
+    tree: app_commands.CommandTree,
+    applicationId: Optional[int],
+    path: str = ".treehash",
+) -> bool:
+    """前回 sync したときとコマンドの定義が変わっていれば sync し、sync したかを返す"""
+    digest = treeHash(tree, applicationId)
+    try:
+        with open(path) as f:
+            if f.read().strip() == digest:
+                return False
+    except FileNotFoundError:
+        pass
+
+    await tree.sync()
+    # sync が終わってから書く (途中で落ちたら次回もう一度 sync する)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(digest)
+    os.replace(tmp, path)
+    return True
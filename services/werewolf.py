@@ -1,69 +1,29 @@
-import enum
+import asyncio
+import random
+import time
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple, Union
 
 import discord
 
-
-# 役職
-class Role(enum.Enum):
-    # 村人陣営
-    VILLAGER = "VILLAGER"  # 村人
-    KNIGHT = "KNIGHT"  # 騎士
-    TELLER = "TELLER"  # 占い師
-    PSYCHIC = "PSYCHIC"  # 霊能者
-    BAKERY = "BAKERY"  # パン屋
-    # 人狼陣営
-    WEREWOLF = "WEREWOLF"  # 人狼
-    MADMAN = "MADMAN"  # 狂人
-    # 第三陣営
-    FOX = "FOX"  # 妖狐
-
-
-# 陣営
-class RoleType(enum.IntEnum):
-    VILLAGER = 0  # 村人
-    WEREWOLF = 1  # 人狼
-    OTHER = 2  # 第三陣営
-
-
-# 役職 → 陣営 の対応表
-ROLE_TO_TYPE = {
-    # 村人陣営
-    Role.VILLAGER: RoleType.VILLAGER,
-    Role.KNIGHT: RoleType.VILLAGER,
-    Role.TELLER: RoleType.VILLAGER,
-    Role.PSYCHIC: RoleType.VILLAGER,
-    Role.BAKERY: RoleType.VILLAGER,
-    # 人狼陣営
-    Role.WEREWOLF: RoleType.WEREWOLF,
-    Role.MADMAN: RoleType.WEREWOLF,
-    # 第三陣営
-    Role.FOX: RoleType.OTHER,
-}
-
-# 役職 → 名前 の対応表
-ROLE_TO_NAME = {
-    # 村人陣営
-    Role.VILLAGER: "村人",
-    Role.KNIGHT: "騎士",
-    Role.TELLER: "占い師",
-    Role.PSYCHIC: "霊能者",
-    Role.BAKERY: "パン屋",
-    # 人狼陣営
-    Role.WEREWOLF: "人狼",
-    Role.MADMAN: "狂人",
-    # 第三陣営
-    Role.FOX: "妖狐",
-}
-
-
-def getRoleType(role: Role) -> RoleType:
-    return ROLE_TO_TYPE[role]
-
-
-def getRoleName(role: Role) -> str:
-    return ROLE_TO_NAME[role]
+from services.engine import (
+    ROLE_TO_NAME,
+    ROLE_TO_TYPE,
+    Engine,
+    EndType,
+    NightResult,
+    Role,
+    RoleType,
+    Scene,
+    VoteResult,
+    getRoleName,
+    getRoleType,
+)
+from services.history import GameRecord
+from services.options import OptionCache
+from services.pool import ChannelPool
+from services.replay import GameLog
+from services.snapshot import SnapshotStore
 
 
 @dataclass(slots=True, weakref_slot=True)
@@ -74,38 +34,162 @@ class Member:
     dead: bool = False
 
 
-class Scene(enum.Enum):
-    NIGHT = "NIGHT"
-    DAY = "DAY"
-    EVENING = "EVENING"
-
-
-class Game:
-    entries: List[discord.Member] = []
-    members: List[Member] = []
-    channels: List[discord.VoiceChannel] = []
-    cast: Dict[Role, int] = {}
-    days: int = 0
-    inGame: bool = False
-    scene: Scene = Scene.NIGHT
-    seconds = 0
-    werewolfTarget: discord.Member = None
-    tellerTarget: Dict[discord.Member, discord.Member] = {}
-    knightTarget: Dict[discord.Member, discord.Member] = {}
-    votes: Dict[discord.Member, discord.Member] = {}
-    force: bool = False
-
-    @classmethod
-    def reset(cls):
-        cls.entries = []
-        cls.members = []
-        cls.channels = []
-        cls.days = 0
-        cls.inGame = False
-        cls.scene = Scene.NIGHT
-        cls.seconds = 0
-        cls.werewolfTarget = None
-        cls.tellerTarget = {}
-        cls.knightTarget = {}
-        cls.votes = {}
-        cls.force = False
+class GameSession:
+    """1つのロビーで進行する人狼ゲームの状態"""
+
+    def __init__(self, guildId: int, lobbyId: int):
+        self.guildId = guildId
+        self.lobbyId = lobbyId
+        self.notificationChannel: discord.TextChannel = None
+        self.lobbyChannel: discord.VoiceChannel = None
+        self.category: discord.CategoryChannel = None
+        self.adminRole: discord.Role = None
+        self.pool: ChannelPool = None
+        self.store: SnapshotStore = None
+        self.cast: Dict[Role, int] = {}
+        self.reset()
+
+    def reset(self):
+        # ロビーにいるメンバー (メンバーID → メンバー、入った順)
+        self.entries: Dict[int, discord.Member] = {}
+        self.members: List[Member] = []
+        # メンバーID → Member / 役職 → Member
+        self.membersById: Dict[int, Member] = {}
+        self.byRole: Dict[Role, List[Member]] = {}
+        # ルールと生存状況は Engine が持つ (プレイヤーはメンバーIDで扱う)
+        self.engine = Engine([])
+        # パネルの選択肢 (誰かが死ぬまで使い回す)
+        self.options = OptionCache(self)
+        self.channels: List[discord.VoiceChannel] = []
+        # メンバーID → 個人チャンネル
+        self.privateChannels: Dict[int, discord.VoiceChannel] = {}
+        self.werewolfChannel: discord.VoiceChannel = None
+        self.ghostChannel: discord.TextChannel = None
+        self.countMessage: discord.Message = None
+        # ゲームの出来事を書き出すリプレイログ
+        self.log: Optional[GameLog] = None
+        # 終了後に HistoryStore に書く戦績
+        self.history: Optional[GameRecord] = None
+        self.inGame: bool = False
+        self.seconds = 0
+        self.force: bool = False
+        # 現在のフェーズの締め切り (UNIX 時刻) と、締め切り前に終わらせるためのイベント
+        self.deadline: float = 0
+        self.phaseDone = asyncio.Event()
+
+    @property
+    def days(self) -> int:
+        return self.engine.days
+
+    @property
+    def scene(self) -> Scene:
+        return self.engine.scene
+
+    def startPhase(self, seconds: int, deadline: Optional[float] = None):
+        """フェーズの締め切りを決める (行動の受付より前に呼ぶ)
+
+        再起動から再開するときは保存しておいた deadline を渡す
+        """
+        self.seconds = seconds
+        self.deadline = deadline or time.time() + seconds
+        if not self.force:
+            self.phaseDone.clear()
+
+    def endPhase(self, delay: float = 0):
+        """締め切りを待たずに現在のフェーズを終わらせる (delay 秒後でもよい)"""
+        if delay <= 0:
+            self.phaseDone.set()
+            return
+        asyncio.get_running_loop().call_later(delay, self.endPhaseOf, self.deadline)
+
+    def endPhaseOf(self, deadline: float):
+        # 待っている間に次のフェーズに進んでいたら何もしない
+        if self.deadline == deadline:
+            self.phaseDone.set()
+
+    def forceEnd(self):
+        self.force = True
+        self.phaseDone.set()
+
+    def record(self, kind: str, actor: int, target: int):
+        """受け付けた行動を store とリプレイログに書き残す"""
+        if self.store is not None and self.inGame:
+            self.store.saveAction(self, kind, actor, target)
+        if self.log is not None:
+            self.log.action(kind, actor, target)
+
+    def seat(self, members: List[Member], rng: Optional[random.Random] = None):
+        """配役済みのメンバーを登録して索引と Engine を作る"""
+        self.members = members
+        self.membersById = {member.member.id: member for member in members}
+        self.byRole = {}
+        for member in members:
+            self.byRole.setdefault(member.role, []).append(member)
+        self.engine = Engine(
+            [(member.member.id, member.role) for member in members], rng
+        )
+
+    def get(self, member: Union[discord.abc.Snowflake, int]) -> Optional[Member]:
+        return self.membersById.get(getattr(member, "id", member))
+
+    def withRole(self, role: Role) -> List[Member]:
+        return self.byRole.get(role, [])
+
+    def aliveMembers(self, exclude: Optional[Role] = None) -> List[Member]:
+        """生存者を members の順に返す (exclude の役職は除く)"""
+        return [self.membersById[player] for player in self.engine.alive(exclude)]
+
+    def isAlive(self, member: discord.abc.Snowflake) -> bool:
+        return self.engine.isAlive(member.id)
+
+    def countAlive(
+        self, role: Optional[Role] = None, roleType: Optional[RoleType] = None
+    ) -> int:
+        return self.engine.countAlive(role, roleType)
+
+    def apply(self, result: Union[VoteResult, NightResult]) -> List[Member]:
+        """Engine の結果で死亡したメンバーを Member.dead に反映して返す"""
+        dead = [self.membersById[player] for player in result.deaths]
+        for member in dead:
+            member.dead = True
+        return dead
+
+
+class SessionRegistry:
+    """ギルド・ロビーごとの GameSession を管理する"""
+
+    def __init__(self):
+        self.sessions: Dict[Tuple[int, int], GameSession] = {}
+        # チャンネルID → セッション (ロビー・通知・ゲーム用チャンネル)
+        self.channels: Dict[int, GameSession] = {}
+
+    def open(self, guildId: int, lobbyId: int) -> GameSession:
+        session = self.sessions.get((guildId, lobbyId))
+        if session is None:
+            session = GameSession(guildId, lobbyId)
+            self.sessions[(guildId, lobbyId)] = session
+            self.channels[lobbyId] = session
+        return session
+
+    def get(self, guildId: int, lobbyId: int) -> Optional[GameSession]:
+        return self.sessions.get((guildId, lobbyId))
+
+    def byChannel(self, channelId: int) -> Optional[GameSession]:
+        return self.channels.get(channelId)
+
+    def forGuild(self, guildId: int) -> List[GameSession]:
+        return [s for (g, _), s in self.sessions.items() if g == guildId]
+
+    def bind(self, session: GameSession, channelId: int):
+        self.channels[channelId] = session
+
+    def unbind(self, channelId: int):
+        session = self.channels.get(channelId)
+        if session is not None and session.lobbyId != channelId:
+            del self.channels[channelId]
+
+    def __iter__(self):
+        return iter(self.sessions.values())
+
+    def __len__(self):
+        return len(self.sessions)